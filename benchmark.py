@@ -0,0 +1,454 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import time
+import argparse
+import threading
+
+from collections import OrderedDict
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from configfileparser import *
+from serialinterface import SerialInterface
+from i2cinterface import I2CInterface
+from pwminterface import PWMInterface
+from httpinterface import HTTPInterface
+from outputdispatcher import OutputDispatcher
+
+OUTPUTS = ["serial", "i2c", "pwm", "http"]
+OUTPUT_PREFIX = "output."
+# the number of the latest frames with known publish time
+PUBLISH_HISTORY = 64
+INTERFACE_SECTIONS = {
+    "serial": SERIAL_INTERFACE,
+    "i2c": I2C_INTERFACE,
+    "pwm": PWM_INTERFACE,
+    "http": HTTP_INTERFACE
+}
+
+class BenchmarkSource(object):
+    """ Data source publishing synthetic or replayed frames at the fixed rate.
+    The publish time of the frame taken by the output thread is kept in thread local storage.
+    """
+
+    def __init__(self, rate, frames=None):
+        """ Initializer
+
+        :param rate: frames per second
+        :param frames: list of tuples (left, right, mono) to replay, None - synthetic data
+        """
+        self.period = 1.0 / rate
+        self.frames = frames
+        self.lock = threading.Lock()
+        self.frame_number = 0
+        self.frame_condition = threading.Condition()
+        self.local = threading.local()
+        self.data = ()
+        self.publish_time = None
+        self.publish_times = OrderedDict()
+        self.running = False
+
+    def start(self):
+        """ Start publishing thread """
+
+        self.running = True
+        self.thread = threading.Thread(target=self.publish)
+        self.thread.start()
+
+    def stop(self):
+        """ Stop publishing thread """
+
+        self.running = False
+        self.thread.join()
+
+    def get_frame(self, n):
+        """ Get frame for the provided number. Synthetic frames change every time.
+
+        :param n: frame number
+        :return: tuple (left, right, mono)
+        """
+        if self.frames:
+            return self.frames[n % len(self.frames)]
+
+        left = 10 + (n * 37) % 80
+        right = 10 + (n * 53) % 80
+        return (left, right, (left + right) / 2)
+
+    def publish(self):
+        """ Publishing thread method """
+
+        next_time = time.perf_counter()
+        n = 0
+        while self.running:
+            with self.lock:
+                self.data = self.get_frame(n)
+                self.publish_time = time.perf_counter()
+                self.publish_times[id(self.data)] = self.publish_time
+                if len(self.publish_times) > PUBLISH_HISTORY:
+                    self.publish_times.popitem(last=False)
+            with self.frame_condition:
+                self.frame_number += 1
+                self.frame_condition.notify_all()
+            n += 1
+
+            next_time += self.period
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def get_current_data(self):
+        """ Return current data and remember its publish time for the calling thread """
+
+        with self.lock:
+            self.local.publish_time = self.publish_time
+            return self.data
+
+    def set_publish_time(self, data):
+        """ Remember publish time of the frame passed to the calling thread by the dispatcher
+
+        :param data: frame
+        """
+        with self.lock:
+            self.local.publish_time = self.publish_times.get(id(data))
+
+    def wait_for_frame(self, frame_number, timeout):
+        """ Wait for the new frame. Used by the output dispatcher.
+
+        :param frame_number: the last known frame number
+        :param timeout: the longest waiting time
+        :return: the current frame number
+        """
+        with self.frame_condition:
+            if self.frame_number == frame_number:
+                self.frame_condition.wait(timeout)
+            return self.frame_number
+
+class Recorder(object):
+    """ Records device writes: latency since publish, write times, bytes and CPU time of the writing threads """
+
+    def __init__(self, source):
+        """ Initializer
+
+        :param source: benchmark source
+        """
+        self.source = source
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """ Clear recorded writes """
+
+        self.latencies = []
+        self.write_times = []
+        self.frame_times = []
+        self.last_publish_time = None
+        self.bytes = 0
+        self.thread_times = {}
+
+    def record(self, size=0):
+        """ Record one device write. Called in the writing thread.
+
+        :param size: number of written bytes
+        """
+        now = time.perf_counter()
+        publish_time = getattr(self.source.local, "publish_time", None)
+        cpu = time.thread_time()
+        with self.lock:
+            if publish_time != None and publish_time != self.last_publish_time:
+                self.latencies.append(now - publish_time)
+                self.frame_times.append(now)
+                self.last_publish_time = publish_time
+            self.write_times.append(now)
+            self.bytes += size
+            t = self.thread_times.setdefault(threading.get_ident(), [cpu, cpu])
+            t[1] = cpu
+
+    def get_results(self, duration):
+        """ Calculate results
+
+        :param duration: benchmark duration (seconds)
+        :return: dictionary with results
+        """
+        r = {"writes": len(self.write_times), "frames": len(self.frame_times),
+            "frames.per.second": len(self.frame_times) / duration, "bytes.per.second": self.bytes / duration}
+
+        cpu = sum(t[1] - t[0] for t in self.thread_times.values())
+        r["cpu.percent"] = cpu / duration * 100
+
+        if len(self.frame_times) > 1:
+            r["period"] = (self.frame_times[-1] - self.frame_times[0]) / (len(self.frame_times) - 1)
+
+        latencies = sorted(self.latencies)
+        if latencies:
+            r["latency.avg"] = sum(latencies) / len(latencies)
+            r["latency.p50"] = latencies[len(latencies) // 2]
+            r["latency.p95"] = latencies[int(len(latencies) * 0.95)]
+            r["latency.max"] = latencies[-1]
+        return r
+
+class DispatchedOutput(object):
+    """ Output wrapper which passes publish time of the dispatched frame to the writing thread """
+
+    def __init__(self, output, source):
+        self.output = output
+        self.source = source
+
+    def start_output(self):
+        self.output.start_output()
+
+    def write_frame(self, v):
+        self.source.set_publish_time(v)
+        self.output.write_frame(v)
+
+    def stop_output(self):
+        self.output.stop_output()
+
+class FakeSMBus(object):
+    """ SMBus stand-in which records writes """
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def write_byte_data(self, address, command, value):
+        self.recorder.record(1)
+
+    def write_word_data(self, address, command, value):
+        self.recorder.record(2)
+
+    def write_i2c_block_data(self, address, command, values):
+        self.recorder.record(len(values))
+
+class FakePWM(object):
+    """ RPi.GPIO PWM stand-in which records duty cycle changes """
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def start(self, value):
+        pass
+
+    def ChangeDutyCycle(self, value):
+        self.recorder.record()
+
+    def stop(self, value=None):
+        pass
+
+class FakeGPIO(object):
+    """ RPi.GPIO module stand-in """
+
+    BCM = 11
+    OUT = 0
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, mode):
+        pass
+
+    def PWM(self, pin, frequency):
+        return FakePWM(self.recorder)
+
+class RecordingSession(object):
+    """ Wrapper of the requests session which records completed requests """
+
+    def __init__(self, session, recorder):
+        self.session = session
+        self.recorder = recorder
+
+    def put(self, url, **kwargs):
+        response = self.session.put(url, **kwargs)
+        self.recorder.record(len(response.request.body or b""))
+        return response
+
+    def close(self):
+        self.session.close()
+
+class RecordingHTTPInterface(HTTPInterface):
+    """ HTTP interface with recording session """
+
+    def __init__(self, config, data_source, recorder):
+        HTTPInterface.__init__(self, config, data_source)
+        self.recorder = recorder
+
+    def start_output(self):
+        HTTPInterface.start_output(self)
+        self.session = RecordingSession(self.session, self.recorder)
+
+class TargetHandler(BaseHTTPRequestHandler):
+    """ Local HTTP target """
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def create_serial(recorder):
+    """ Create serial port on the pseudo terminal. The other side is drained by the thread.
+
+    :param recorder: recorder
+    :return: tuple (serial object, master file descriptor)
+    """
+    import pty
+    import tty
+    from serial import Serial
+
+    class RecordingSerial(Serial):
+        def write(self, data):
+            n = Serial.write(self, data)
+            recorder.record(n or 0)
+            return n
+
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    serial = RecordingSerial()
+    serial.port = os.ttyname(slave)
+
+    def drain():
+        while True:
+            try:
+                if not os.read(master, 4096):
+                    break
+            except OSError:
+                break
+
+    threading.Thread(target=drain, daemon=True).start()
+    return serial, master
+
+def create_output(name, config, source, recorder):
+    """ Create output with fake device
+
+    :param name: output name
+    :param config: meter configuration
+    :param source: benchmark source
+    :param recorder: recorder
+    :return: tuple (output, cleanup function)
+    """
+    if name == "serial":
+        serial, master = create_serial(recorder)
+        config[SERIAL_INTERFACE][DEVICE_NAME] = serial.port
+        return SerialInterface(config, source, serial), lambda: (serial.close(), os.close(master))
+    elif name == "i2c":
+        return I2CInterface(config, source, FakeSMBus(recorder)), None
+    elif name == "pwm":
+        return PWMInterface(config, source, FakeGPIO(recorder)), None
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TargetHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    config[HTTP_INTERFACE][TARGET_URL] = "http://127.0.0.1:%d/vumeter" % server.server_address[1]
+    return RecordingHTTPInterface(config, source, recorder), server.shutdown
+
+def run_output(name, args, frames):
+    """ Run one output benchmark
+
+    :param name: output name
+    :param args: command line arguments
+    :param frames: replayed frames or None
+    :return: dictionary with results
+    """
+    config = ConfigFileParser().meter_config
+    if args.period:
+        config[INTERFACE_SECTIONS[name]][UPDATE_PERIOD] = args.period
+
+    source = BenchmarkSource(args.rate, frames)
+    recorder = Recorder(source)
+    output, cleanup = create_output(name, config, source, recorder)
+
+    if args.dispatcher:
+        dispatcher = OutputDispatcher(source)
+        dispatcher.add_output(OUTPUT_PREFIX + name, DispatchedOutput(output, source), output.update_period)
+        start, stop = dispatcher.start, dispatcher.stop
+    else:
+        start, stop = output.start_writing, output.stop_writing
+
+    source.start()
+    start()
+    time.sleep(0.1)
+    recorder.reset()
+    process_time = time.process_time()
+    time.sleep(args.duration)
+    process_time = time.process_time() - process_time
+    results = recorder.get_results(args.duration)
+
+    stop()
+    source.stop()
+    if cleanup:
+        cleanup()
+
+    results["process.cpu.percent"] = process_time / args.duration * 100
+    results["configured.period"] = output.update_period
+    return results
+
+def read_frames(path):
+    """ Read frames for replay. Each line contains left, right and optional mono values.
+
+    :param path: file path
+    :return: list of tuples (left, right, mono)
+    """
+    frames = []
+    with open(path) as f:
+        for line in f:
+            values = [float(v) for v in line.replace(",", " ").split()]
+            if len(values) >= 2:
+                mono = values[2] if len(values) > 2 else (values[0] + values[1]) / 2
+                frames.append((values[0], values[1], mono))
+    return frames
+
+def print_results(name, r):
+    """ Print results of one output
+
+    :param name: output name
+    :param r: results
+    """
+    ms = lambda k: "%7.2f" % (r[k] * 1000) if k in r else "      -"
+    print("%-7s %7d %7d %s %s %s %s %s %6.1f%% %6.1f%% %9.0f" % (name, r["frames"], r["writes"],
+        ms("configured.period"), ms("period"), ms("latency.avg"), ms("latency.p95"), ms("latency.max"),
+        r["cpu.percent"], r["process.cpu.percent"], r["bytes.per.second"]))
+
+if __name__ == "__main__":
+    """ Output interface benchmark. Example: python3 benchmark.py --outputs serial,i2c --rate 100 --duration 5 """
+
+    parser = argparse.ArgumentParser(description="PeppyMeter output benchmark")
+    parser.add_argument("--outputs", default=",".join(OUTPUTS), help="comma separated outputs: " + ", ".join(OUTPUTS))
+    parser.add_argument("--rate", type=float, default=100.0, help="data frames per second")
+    parser.add_argument("--duration", type=float, default=5.0, help="duration of each output run (seconds)")
+    parser.add_argument("--period", type=float, default=None, help="update period of the outputs (seconds), default - from config.txt")
+    parser.add_argument("--replay", default=None, help="file with frames to replay: left right [mono] per line")
+    parser.add_argument("--dispatcher", action="store_true", help="drive the output by the output dispatcher")
+    args = parser.parse_args()
+
+    frames = read_frames(args.replay) if args.replay else None
+
+    print("%-7s %7s %7s %7s %7s %7s %7s %7s %7s %7s %9s" % ("output", "frames", "writes", "cfg ms", "per ms",
+        "lat avg", "lat p95", "lat max", "cpu", "proc", "bytes/s"))
+    for name in args.outputs.split(","):
+        name = name.strip()
+        if name not in OUTPUTS:
+            print("Unknown output: " + name)
+            sys.exit(1)
+        print_results(name, run_output(name, args, frames))
@@ -16,13 +16,15 @@
 # along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
 
 import math
+import time
 
 from configfileparser import METER_X, METER_Y, UI_REFRESH_PERIOD, NEEDLE_WIDTH, NEEDLE_HEIGHT
 
 class CircularAnimator(object):
     """ Provides needle circular animation """
     
-    def __init__(self, data_source, component, base, meter_parameters, needles, needle_rects, get_data_method, origin_x, origin_y):
+    def __init__(self, data_source, component, base, meter_parameters, needles, needle_rects, get_data_method, origin_x, origin_y,
+                 interpolator=None):
         """ Initializer
         
         :param data_source: data source
@@ -34,6 +36,7 @@ class CircularAnimator(object):
         :param get_data_method: method to get data
         :param origin_x: rotation X origin
         :param origin_y: rotation Y origin
+        :param interpolator: needle interpolator, None - jump to the new data value
         """
         self.data_source = data_source
         self.component = component
@@ -46,6 +49,9 @@ class CircularAnimator(object):
         self.meter_parameters = meter_parameters
         self.origin_x = origin_x + meter_parameters[METER_X]
         self.origin_y = origin_y + meter_parameters[METER_Y]
+        self.interpolator = interpolator
+        self.data_time = None
+        self.sprite_index = 0
         self.set_sprite(None, True)
         
     def run(self):
@@ -53,12 +59,40 @@ class CircularAnimator(object):
         
         :return: list of rectangles for update
         """
+        if self.interpolator:
+            return self.run_interpolated()
+
         volume = self.get_data()
         n, a = self.set_sprite(volume)
         self.previous_index = int(n)
 
         return a
 
+    def run_interpolated(self):
+        """ Feed new data into the interpolator and display the sprite for the current needle position.
+        The needle moves at the render rate using all sprites defined by 'steps.per.degree'.
+
+        :return: rectangle for update, or None if unchanged
+        """
+        data_time = self.data_source.get_current_data_time()
+        if data_time != self.data_time:
+            self.data_time = data_time
+            self.interpolator.update(self.get_data(), data_time)
+
+        volume = self.interpolator.get_value(time.perf_counter())
+        n = (volume * self.base.max_volume * self.base.incr) / 100.0
+        index = int(n * self.base.steps_per_degree + 0.5)
+        if index >= len(self.needles):
+            index = len(self.needles) - 1
+        elif index < 0:
+            index = 0
+
+        if index == self.sprite_index:
+            return None
+
+        self.previous_index = int(n)
+        return self.draw_sprite(index)
+
     def set_sprite(self, volume, init=False):
         """ Set current sprite for new volume level
 
@@ -78,7 +112,6 @@ class CircularAnimator(object):
         if self.previous_index == int(n) and not init:
             return (n, None)
             
-        previous_rect = self.component.bounding_box.copy()
         diff = n - self.previous_index
         sub_steps = range(int(abs(diff)) * self.base.steps_per_degree)
         sign = int(math.copysign(1, diff))
@@ -87,16 +120,27 @@ class CircularAnimator(object):
         else:
             m = 0
 
+        next_index = (self.previous_index * self.base.steps_per_degree) + (m * sign)
+        if next_index >= len(self.needles):
+            next_index = len(self.needles) - 1
+
+        return (n, self.draw_sprite(next_index))
+
+    def draw_sprite(self, next_index):
+        """ Restore background under the current sprite and draw the new one
+
+        :param next_index: index of the new sprite
+
+        :return: rectangle for update
+        """
+        previous_rect = self.component.bounding_box.copy()
         gap = 4
         previous_rect.x -= gap
         previous_rect.y -= gap
         previous_rect.w += gap * 2
         previous_rect.h += gap * 2
         self.base.draw_bgr_fgr(previous_rect, self.base.bgr)
-        next_index = (self.previous_index * self.base.steps_per_degree) + (m * sign)
-        if next_index >= len(self.needles):
-            next_index = len(self.needles) - 1
-
+        self.sprite_index = next_index
         sprite = self.needles[next_index]
         self.component.content = sprite
         r = self.needle_rects[next_index]
@@ -110,5 +154,5 @@ class CircularAnimator(object):
         if self.base.fgr:
             self.base.draw_bgr_fgr(a, self.base.fgr)
 
-        return (n, a.copy())
+        return a.copy()
     
@@ -49,6 +49,7 @@ class Component(object):
         self.text = None
         self.text_size = None
         self.image_filename = None
+        self.blend_flags = 0
 
     def clean(self):
         """ Clean component by filling its bounding box by background color """
@@ -93,11 +94,11 @@ class Component(object):
             try:
                 if self.bounding_box:
                     if isinstance(self.content, tuple):
-                        self.screen.blit(self.content[1], (self.content_x, self.content_y), self.bounding_box)
+                        self.screen.blit(self.content[1], (self.content_x, self.content_y), self.bounding_box, self.blend_flags)
                     else:
-                        self.screen.blit(self.content, self.bounding_box)
+                        self.screen.blit(self.content, self.bounding_box, None, self.blend_flags)
                 else:
-                    self.screen.blit(comp, (x, y))
+                    self.screen.blit(comp, (x, y), None, self.blend_flags)
             except:
                 pass
  
@@ -27,8 +27,13 @@ WIDTH = "width"
 HEIGHT = "height"
 DEPTH = "depth"
 FRAME_RATE = "frame.rate"
+NEEDLE_INTERPOLATION = "needle.interpolation"
+NEEDLE_RESPONSE_TIME = "needle.response.time"
+PREMULTIPLIED_ALPHA = "premultiplied.alpha"
 SCREEN_WIDTH = "screen.width"
 SCREEN_HEIGHT = "screen.height"
+SCREEN_DEPTH = "screen.depth"
+DISPLAY_BACKEND = "display.backend"
 SCREEN_RECT = "screen.rect"
 EXIT_ON_TOUCH = "exit.on.touch"
 STOP_DISPLAY_ON_TOUCH = "stop.display.on.touch"
@@ -37,26 +42,38 @@ OUTPUT_SERIAL = "output.serial"
 OUTPUT_I2C = "output.i2c"
 OUTPUT_PWM = "output.pwm"
 OUTPUT_HTTP = "output.http"
+RUN_MODE = "run.mode"
+OUTPUT_DISPATCHER = "output.dispatcher"
+FRAME_PROFILER = "frame.profiler"
+FRAME_PROFILER_SIZE = "frame.profiler.size"
 
 SERIAL_INTERFACE = "serial.interface"
 DEVICE_NAME = "device.name"
 BAUD_RATE = "baud.rate"
 INCLUDE_TIME = "include.time"
 UPDATE_PERIOD = "update.period"
+FRAME_FORMAT = "frame.format"
+SEND_ON_CHANGE = "send.on.change"
 
 I2C_INTERFACE = "i2c.interface"
 PORT = "port"
 LEFT_CHANNEL_ADDRESS = "left.channel.address"
 RIGHT_CHANNEL_ADDRESS = "right.channel.address"
 OUTPUT_SIZE = "output.size"
+OUTPUT_CURVE = "output.curve"
 
 HTTP_INTERFACE = "http.interface"
 TARGET_URL = "target.url"
+TIMEOUT = "timeout"
+CHANGE_THRESHOLD = "change.threshold"
+HEARTBEAT_PERIOD = "heartbeat.period"
 
 PWM_INTERFACE = "pwm.interface"
 FREQUENCY = "frequency"
 GPIO_PIN_LEFT = "gpio.pin.left"
 GPIO_PIN_RIGHT = "gpio.pin.right"
+GAMMA = "gamma"
+SMOOTHING = "smoothing"
 
 SDL_ENV = "sdl.env"
 FRAMEBUFFER_DEVICE = "framebuffer.device"
@@ -72,6 +89,8 @@ SMOOTH_BUFFER_SIZE = "smooth.buffer.size"
 USE_LOGGING = "use.logging"
 USE_CACHE = "use.cache"
 CACHE_SIZE = "cache.size"
+CACHE_COMPRESSION = "cache.compression"
+CACHE_COMPRESSION_SIZE = "cache.compression.size"
 USAGE = "usage"
 USE_VU_METER = "vu.meter"
 METER = "meter"
@@ -79,6 +98,13 @@ DATA_SOURCE = "data.source"
 TYPE = "type"
 POLLING_INTERVAL = "polling.interval"
 PIPE_NAME = "pipe.name"
+UDP_PORT = "udp.port"
+PIPE_TIMESTAMP = "pipe.timestamp"
+DELAY = "delay"
+SHM_NAME = "shm.name"
+PUBLISH_NAME = "publish.name"
+PUBLISH_SLOTS = "publish.slots"
+BUS_NAME = "bus.name"
 VOLUME_CONSTANT = "volume.constant"
 VOLUME_MIN = "volume.min"
 VOLUME_MAX = "volume.max"
@@ -136,6 +162,12 @@ TYPE_CIRCULAR = "circular"
 
 WEB_SERVER = "web.server"
 HTTP_PORT = "http.port"
+INGEST_MAX_RATE = "ingest.max.rate"
+BROADCAST_PERIOD = "broadcast.period"
+BROADCAST_FORMAT = "broadcast.format"
+REMOTE_PIXEL_FORMAT = "remote.pixel.format"
+REMOTE_COMPRESSION = "remote.compression"
+ENABLED = "enabled"
 
 NEEDLE_WIDTH = "needle.width"
 NEEDLE_HEIGHT = "needle.height"
@@ -156,6 +188,16 @@ DIRECTION_RIGHT_LEFT = "right-left"
 INDICATOR_TYPE = "indicator.type"
 SINGLE = "single"
 
+BACKEND_SDL = "sdl"
+BACKEND_FRAMEBUFFER = "framebuffer"
+
+RUN_MODE_SINGLE = "single"
+RUN_MODE_MULTIPROCESS = "multiprocess"
+
+INTERPOLATION_NONE = "none"
+INTERPOLATION_LINEAR = "linear"
+INTERPOLATION_BALLISTIC = "ballistic"
+
 class ConfigFileParser(object):
     """ Configuration file parser """
     
@@ -182,20 +224,34 @@ class ConfigFileParser(object):
         self.meter_config[EXIT_ON_TOUCH] = c.getboolean(CURRENT, EXIT_ON_TOUCH)
         self.meter_config[STOP_DISPLAY_ON_TOUCH] = c.getboolean(CURRENT, STOP_DISPLAY_ON_TOUCH)
         self.meter_config[OUTPUT_DISPLAY] = c.getboolean(CURRENT, OUTPUT_DISPLAY)
+        self.meter_config[DISPLAY_BACKEND] = c[CURRENT].get(DISPLAY_BACKEND, BACKEND_SDL)
         self.meter_config[OUTPUT_SERIAL] = c.getboolean(CURRENT, OUTPUT_SERIAL)
         self.meter_config[OUTPUT_I2C] = c.getboolean(CURRENT, OUTPUT_I2C)
         self.meter_config[OUTPUT_PWM] = c.getboolean(CURRENT, OUTPUT_PWM)
         self.meter_config[OUTPUT_HTTP] = c.getboolean(CURRENT, OUTPUT_HTTP)
+        self.meter_config[OUTPUT_DISPATCHER] = c[CURRENT].getboolean(OUTPUT_DISPATCHER, False)
         self.meter_config[USE_LOGGING] = c.getboolean(CURRENT, USE_LOGGING)
+        self.meter_config[RUN_MODE] = c[CURRENT].get(RUN_MODE, RUN_MODE_SINGLE)
         self.meter_config[USE_CACHE] = c.getboolean(CURRENT, USE_CACHE)
         self.meter_config[CACHE_SIZE] = c.getint(CURRENT, CACHE_SIZE)
+        self.meter_config[CACHE_COMPRESSION] = c[CURRENT].getboolean(CACHE_COMPRESSION, False)
+        self.meter_config[CACHE_COMPRESSION_SIZE] = c[CURRENT].getint(CACHE_COMPRESSION_SIZE, 20)
         self.meter_config[FRAME_RATE] = c.getint(CURRENT, FRAME_RATE)
+        self.meter_config[NEEDLE_INTERPOLATION] = c[CURRENT].get(NEEDLE_INTERPOLATION, INTERPOLATION_NONE)
+        self.meter_config[NEEDLE_RESPONSE_TIME] = c[CURRENT].getfloat(NEEDLE_RESPONSE_TIME, 0.3)
+        self.meter_config[PREMULTIPLIED_ALPHA] = c[CURRENT].getboolean(PREMULTIPLIED_ALPHA, True)
+        self.meter_config[FRAME_PROFILER] = c[CURRENT].getboolean(FRAME_PROFILER, False)
+        self.meter_config[FRAME_PROFILER_SIZE] = c[CURRENT].getint(FRAME_PROFILER_SIZE, 1024)
         
         self.meter_config[SERIAL_INTERFACE] = {}
         self.meter_config[SERIAL_INTERFACE][DEVICE_NAME] = c.get(SERIAL_INTERFACE, DEVICE_NAME)
         self.meter_config[SERIAL_INTERFACE][BAUD_RATE] = c.getint(SERIAL_INTERFACE, BAUD_RATE)
         self.meter_config[SERIAL_INTERFACE][INCLUDE_TIME] = c.getboolean(SERIAL_INTERFACE, INCLUDE_TIME)
         self.meter_config[SERIAL_INTERFACE][UPDATE_PERIOD] = c.getfloat(SERIAL_INTERFACE, UPDATE_PERIOD)
+        self.meter_config[SERIAL_INTERFACE][FRAME_FORMAT] = c[SERIAL_INTERFACE].get(FRAME_FORMAT, "text")
+        self.meter_config[SERIAL_INTERFACE][SEND_ON_CHANGE] = c[SERIAL_INTERFACE].getboolean(SEND_ON_CHANGE, False)
+        self.meter_config[SERIAL_INTERFACE][CHANGE_THRESHOLD] = c[SERIAL_INTERFACE].getfloat(CHANGE_THRESHOLD, 0.5)
+        self.meter_config[SERIAL_INTERFACE][HEARTBEAT_PERIOD] = c[SERIAL_INTERFACE].getfloat(HEARTBEAT_PERIOD, 1.0)
         
         self.meter_config[I2C_INTERFACE] = {}
         self.meter_config[I2C_INTERFACE][PORT] = c.getint(I2C_INTERFACE, PORT)
@@ -203,17 +259,31 @@ class ConfigFileParser(object):
         self.meter_config[I2C_INTERFACE][RIGHT_CHANNEL_ADDRESS] = int(c.get(I2C_INTERFACE, RIGHT_CHANNEL_ADDRESS), 0)
         self.meter_config[I2C_INTERFACE][OUTPUT_SIZE] = c.getint(I2C_INTERFACE, OUTPUT_SIZE)
         self.meter_config[I2C_INTERFACE][UPDATE_PERIOD] = c.getfloat(I2C_INTERFACE, UPDATE_PERIOD)
+        self.meter_config[I2C_INTERFACE][OUTPUT_CURVE] = c[I2C_INTERFACE].get(OUTPUT_CURVE, "linear")
         
         self.meter_config[PWM_INTERFACE] = {}
         self.meter_config[PWM_INTERFACE][FREQUENCY] = c.getint(PWM_INTERFACE, FREQUENCY)
         self.meter_config[PWM_INTERFACE][GPIO_PIN_LEFT] = c.getint(PWM_INTERFACE, GPIO_PIN_LEFT)
         self.meter_config[PWM_INTERFACE][GPIO_PIN_RIGHT] = c.getint(PWM_INTERFACE, GPIO_PIN_RIGHT)
         self.meter_config[PWM_INTERFACE][UPDATE_PERIOD] = c.getfloat(PWM_INTERFACE, UPDATE_PERIOD)
+        self.meter_config[PWM_INTERFACE][GAMMA] = c[PWM_INTERFACE].getfloat(GAMMA, 1.0)
+        self.meter_config[PWM_INTERFACE][CHANGE_THRESHOLD] = c[PWM_INTERFACE].getfloat(CHANGE_THRESHOLD, 0.5)
+        self.meter_config[PWM_INTERFACE][SMOOTHING] = c[PWM_INTERFACE].getfloat(SMOOTHING, 0.0)
 
         self.meter_config[HTTP_INTERFACE] = {TARGET_URL: c.get(HTTP_INTERFACE, TARGET_URL)}
         self.meter_config[HTTP_INTERFACE][UPDATE_PERIOD] = c.getfloat(HTTP_INTERFACE, UPDATE_PERIOD)
+        self.meter_config[HTTP_INTERFACE][TIMEOUT] = c[HTTP_INTERFACE].getfloat(TIMEOUT, 0.5)
+        self.meter_config[HTTP_INTERFACE][CHANGE_THRESHOLD] = c[HTTP_INTERFACE].getfloat(CHANGE_THRESHOLD, 0.5)
+        self.meter_config[HTTP_INTERFACE][HEARTBEAT_PERIOD] = c[HTTP_INTERFACE].getfloat(HEARTBEAT_PERIOD, 1.0)
 
         self.meter_config[HTTP_PORT] = c.get(WEB_SERVER, HTTP_PORT)
+        self.meter_config[WEB_SERVER] = {}
+        self.meter_config[WEB_SERVER][ENABLED] = c[WEB_SERVER].getboolean(ENABLED, False)
+        self.meter_config[WEB_SERVER][INGEST_MAX_RATE] = c[WEB_SERVER].getfloat(INGEST_MAX_RATE, 120.0)
+        self.meter_config[WEB_SERVER][BROADCAST_PERIOD] = c[WEB_SERVER].getfloat(BROADCAST_PERIOD, 0.05)
+        self.meter_config[WEB_SERVER][BROADCAST_FORMAT] = c[WEB_SERVER].get(BROADCAST_FORMAT, "json")
+        self.meter_config[WEB_SERVER][REMOTE_PIXEL_FORMAT] = c[WEB_SERVER].get(REMOTE_PIXEL_FORMAT, "rgb565")
+        self.meter_config[WEB_SERVER][REMOTE_COMPRESSION] = c[WEB_SERVER].getboolean(REMOTE_COMPRESSION, True)
 
         self.meter_config[SDL_ENV] = self.get_sdl_environment_section(c, SDL_ENV)
 
@@ -225,7 +295,7 @@ class ConfigFileParser(object):
         self.meter_config[SCREEN_INFO] = {}
         self.meter_config[SCREEN_INFO][METER_FOLDER] = meter_folder
         self.meter_config[SCREEN_INFO][WIDTH], self.meter_config[SCREEN_INFO][HEIGHT] = self.get_meter_size(meter_folder)
-        self.meter_config[SCREEN_INFO][DEPTH] = DEFAULT_DEPTH
+        self.meter_config[SCREEN_INFO][DEPTH] = c[CURRENT].getint(SCREEN_DEPTH, DEFAULT_DEPTH)
         self.meter_config[DATA_SOURCE] = self.get_data_source_section(c, DATA_SOURCE)        
 
         try:
@@ -291,6 +361,12 @@ class ConfigFileParser(object):
         d[TYPE] = config_file.get(section, TYPE)
         d[POLLING_INTERVAL] = config_file.getfloat(section, POLLING_INTERVAL)
         d[PIPE_NAME] = config_file.get(section, PIPE_NAME)
+        d[PIPE_TIMESTAMP] = config_file[section].getboolean(PIPE_TIMESTAMP, False)
+        d[UDP_PORT] = config_file[section].getint(UDP_PORT, 8002)
+        d[SHM_NAME] = config_file[section].get(SHM_NAME, "peppymeter")
+        d[PUBLISH_NAME] = config_file[section].get(PUBLISH_NAME, "")
+        d[PUBLISH_SLOTS] = config_file[section].getint(PUBLISH_SLOTS, 256)
+        d[BUS_NAME] = config_file[section].get(BUS_NAME, "peppymeter.bus")
         d[VOLUME_CONSTANT] = config_file.getfloat(section, VOLUME_CONSTANT)
         d[VOLUME_MIN] = config_file.getfloat(section, VOLUME_MIN)
         d[VOLUME_MAX] = config_file.getfloat(section, VOLUME_MAX)
@@ -299,6 +375,7 @@ class ConfigFileParser(object):
         d[STEREO_ALGORITHM] = config_file.get(section, STEREO_ALGORITHM)
         d[STEP] = config_file.getint(section, STEP)
         d[SMOOTH_BUFFER_SIZE] = config_file.getint(section, SMOOTH_BUFFER_SIZE)
+        d[DELAY] = config_file[section].getint(DELAY, 0)
         return d
     
     def get_linear_section(self, config_file, section, meter_type):
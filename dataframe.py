@@ -0,0 +1,86 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import struct
+
+# Compact binary data frames.
+# Each frame is little-endian: uint32 timestamp in milliseconds of the producer clock
+# (0 - no timestamp) followed by the left, right and mono values.
+# Format 'f32' uses float32 values in range 0-100 (16 bytes per frame).
+# Format 'u16' uses uint16 values in range 0-65535 (10 bytes per frame).
+# A batch is a sequence of frames ordered by timestamp.
+
+FORMAT_FLOAT = "f32"
+FORMAT_INTEGER = "u16"
+
+FRAME_STRUCTS = {
+    FORMAT_FLOAT: struct.Struct("<I3f"),
+    FORMAT_INTEGER: struct.Struct("<I3H")
+}
+
+INTEGER_SCALE = 100.0 / 65535
+
+def unpack_frames(data, frame_format=FORMAT_FLOAT):
+    """ Unpack batch of binary frames
+
+    :param data: bytes-like object with one or more frames
+    :param frame_format: frame format 'f32' or 'u16'
+
+    :return: list of tuples (timestamp in seconds or None, left, right, mono)
+    """
+    s = FRAME_STRUCTS[frame_format]
+    if len(data) == 0 or len(data) % s.size != 0:
+        raise ValueError("Invalid frame data length: " + str(len(data)))
+
+    frames = []
+    for t, left, right, mono in s.iter_unpack(data):
+        if frame_format == FORMAT_INTEGER:
+            left *= INTEGER_SCALE
+            right *= INTEGER_SCALE
+            mono *= INTEGER_SCALE
+        frames.append((t / 1000.0 if t else None, left, right, mono))
+
+    return frames
+
+def pack_frames(frames, frame_format=FORMAT_FLOAT):
+    """ Pack frames into bytes. Used by producers.
+
+    :param frames: list of tuples (timestamp in seconds or None, left, right, mono)
+    :param frame_format: frame format 'f32' or 'u16'
+
+    :return: bytes
+    """
+    s = FRAME_STRUCTS[frame_format]
+    data = bytearray()
+
+    for t, left, right, mono in frames:
+        t = int(t * 1000) & 0xFFFFFFFF if t else 0
+        if frame_format == FORMAT_INTEGER:
+            data += s.pack(t, to_integer(left), to_integer(right), to_integer(mono))
+        else:
+            data += s.pack(t, left, right, mono)
+
+    return bytes(data)
+
+def to_integer(value):
+    """ Convert value in range 0-100 into uint16
+
+    :param value: value to convert
+
+    :return: integer in range 0-65535
+    """
+    return min(65535, max(0, int(value / INTEGER_SCALE + 0.5)))
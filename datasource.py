@@ -17,14 +17,20 @@
 
 import os
 import math
+import struct
 import time
 import statistics
 import logging
 
 from random import uniform
-from threading import Thread, RLock
+from threading import Thread, RLock, Condition
 from configfileparser import *
 from collections import deque
+from udpreceiver import UdpReceiver
+from seqlock import SeqlockReader
+from framebus import FrameBusWriter, FrameBusReader
+from metrics import registry
+from delayline import DelayLine
 
 SOURCE_CONSTANT = "constant"
 SOURCE_NOISE = "noise"
@@ -33,6 +39,9 @@ SOURCE_TRIANGLE = "triangle"
 SOURCE_SINE = "sine"
 SOURCE_PIPE = "pipe"
 SOURCE_HTTP = "http"
+SOURCE_UDP = "udp"
+SOURCE_SHM = "shm"
+SOURCE_BUS = "bus"
 
 MONO_ALGORITHM_MAXIMUM = "maximum"
 MONO_ALGORITHM_AVERAGE = "average"
@@ -41,6 +50,19 @@ STEREO_ALGORITHM_NEW = "new"
 STEREO_ALGORITHM_LOGARITHM = "logarithm"
 STEREO_ALGORITHM_AVERAGE = "average"
 
+# the maximum number of timestamped HTTP frames waiting for playout
+HTTP_FRAME_BUFFER_SIZE = 256
+# producer clock offset is re-synchronized if it changes more than this value (seconds)
+CLOCK_RESYNC_THRESHOLD = 0.5
+# smoothing factor of the producer clock offset
+CLOCK_OFFSET_SMOOTHING = 0.05
+# optional timestamp after the levels in the pipe frame: d - CLOCK_MONOTONIC seconds of the producer
+# e.g. time.monotonic() in Python, the same clock as the performance counter on Linux
+PIPE_TIMESTAMP_FORMAT = struct.Struct("<d")
+# published peaks are held for this time (seconds) and then fall with the decay rate (units per second)
+PEAK_HOLD_TIME = 1.0
+PEAK_DECAY_RATE = 30.0
+
 class DataSource(object):
     """ Provides methods to generate different types of audio signal. """
     
@@ -64,7 +86,8 @@ class DataSource(object):
         
         self.v = 0
         self.step = self.config[STEP]
-        self.pipe_size = 4
+        self.pipe_timestamp = self.config[PIPE_TIMESTAMP]
+        self.pipe_size = 4 + (PIPE_TIMESTAMP_FORMAT.size if self.pipe_timestamp else 0)
         self.PIPE_BUFFER_SIZE = 1048576 # as defined for Raspberry OS in /proc/sys/fs/pipe-max-size
         self.rng = list(range(int(self.min), int(self.max_in_ui)))
         self.double_rng = self.rng
@@ -73,13 +96,47 @@ class DataSource(object):
         if self.ds_type == SOURCE_PIPE:
             thread = Thread(target=self.open_pipe)
             thread.start()
+        self.udp_receiver = None
+        if self.ds_type == SOURCE_UDP:
+            self.udp_receiver = UdpReceiver(self.config[UDP_PORT])
+        self.shm_reader = None
+        if self.ds_type == SOURCE_SHM:
+            self.shm_reader = SeqlockReader(self.config[SHM_NAME])
+        self.bus_reader = None
+        if self.ds_type == SOURCE_BUS:
+            self.bus_reader = FrameBusReader(self.config[BUS_NAME])
+        self.frame_bus = None
+        if self.config[PUBLISH_NAME]:
+            self.frame_bus = FrameBusWriter(self.config[PUBLISH_NAME], self.config[PUBLISH_SLOTS])
+        self.peaks = [0.0, 0.0]
+        self.peak_times = [0.0, 0.0]
         self.previous_left = self.previous_right = self.previous_mono = 0.0
         self.run_flag = True
+        self.data_thread = None
         self.polling_interval = self.config[POLLING_INTERVAL]
         self.pipe_polling_inerval = self.polling_interval / 10
+        self.delay_line = None
+        if self.config[DELAY] > 0:
+            # half of the polling interval leaves room for the jitter of the source timestamps
+            self.delay_line = DelayLine(self.config[DELAY] / 1000, self.polling_interval / 2)
         self.prev_time = None
         self.data = ()
+        self.data_time = None
+        self.value_time = None
+        self.acquisition_time = None
+        self.frame_number = 0
+        self.frame_condition = Condition()
+        self.poll_latency = registry.histogram("peppymeter_data_poll_seconds", "Time to get one value from the data source",
+            labels={"source": self.ds_type})
+        self.pipe_bytes = registry.counter("peppymeter_pipe_bytes_total", "Bytes drained from the named pipe")
+        self.lateness = registry.histogram("peppymeter_thread_lateness_seconds", "Delay of the thread wake-up after the scheduled time",
+            labels={"thread": "data"})
+        self.ingest_latency = registry.histogram("peppymeter_latency_seconds", "Latency between pipeline stages",
+            labels={"stage": "ingest_publish"})
         self.http_data = ()
+        self.http_data_time = None
+        self.http_frames = deque(maxlen=HTTP_FRAME_BUFFER_SIZE)
+        self.http_clock_offset = None
         self.smooth_buffer_size = self.config[SMOOTH_BUFFER_SIZE]
         self.smooth_buffer = deque(self.smooth_buffer_size*[0], self.smooth_buffer_size)
         for _ in range(self.smooth_buffer_size):
@@ -92,7 +149,10 @@ class DataSource(object):
             SOURCE_TRIANGLE: self.get_triangle_value,
             SOURCE_SINE: self.get_sine_value,
             SOURCE_PIPE: self.get_pipe_value,
-            SOURCE_HTTP: self.get_http_value
+            SOURCE_HTTP: self.get_http_value,
+            SOURCE_UDP: self.get_udp_value,
+            SOURCE_SHM: self.get_shm_value,
+            SOURCE_BUS: self.get_bus_value
         }
     
     def open_pipe(self):
@@ -119,16 +179,24 @@ class DataSource(object):
         logging.debug("pipe flushed")
 
     def start_data_source(self):
-        """ Start data source thread. """ 
+        """ Start data source thread. Does nothing if the thread is already running. """ 
+
+        if self.data_thread and self.data_thread.is_alive():
+            if self.run_flag:
+                return
+            self.data_thread.join()
 
         logging.debug("starting data source...")
 
         if self.ds_type == SOURCE_PIPE:
             self.flush_pipe_buffer()
 
+        if self.udp_receiver and not self.udp_receiver.run_flag:
+            self.udp_receiver.start()
+
         self.run_flag = True
-        thread = Thread(target=self.get_data)
-        thread.start()
+        self.data_thread = Thread(target=self.get_data)
+        self.data_thread.start()
 
         logging.debug("data source started")
         
@@ -136,12 +204,40 @@ class DataSource(object):
         """ Stop data source thread. """ 
                
         self.run_flag = False
+        if self.udp_receiver:
+            self.udp_receiver.stop()
     
     def get_current_data(self):
         """ Return current data """
         
         return self.data
+
+    def get_current_data_time(self):
+        """ Return the time when the current data was received (performance counter seconds) """
+
+        return self.data_time
+
+    def get_current_data_times(self):
+        """ Return the acquisition and publishing time of the current data
+
+        :return: tuple (acquisition time, publishing time) in performance counter seconds
+        """
+        with self.lock:
+            return (self.acquisition_time, self.data_time)
         
+    def wait_for_frame(self, frame_number, timeout):
+        """ Wait until the data source produces frame newer than the provided one
+
+        :param frame_number: the last frame number known to the caller
+        :param timeout: the longest waiting time (seconds)
+
+        :return: the current frame number
+        """
+        with self.frame_condition:
+            if self.frame_number == frame_number:
+                self.frame_condition.wait(timeout)
+            return self.frame_number
+
     def get_current_left_channel_data(self):
         """ Return current left channel value """
         
@@ -167,13 +263,59 @@ class DataSource(object):
             return None
     
     def get_data(self):
-        """ Thread method. """ 
+        """ Thread method. The UDP source publishes each datagram when it arrives, other sources are polled. """ 
                
         while self.run_flag:
+            start = time.perf_counter()
+            previous_time = self.acquisition_time
             with self.lock:
-                self.data = self.get_value()
-            time.sleep(self.polling_interval)
+                self.value_time = None
+                data = self.get_value()
+                self.data_time = time.perf_counter()
+                if self.value_time == None or self.value_time > self.data_time:
+                    self.acquisition_time = start
+                else:
+                    self.acquisition_time = self.value_time
+                if self.delay_line and data:
+                    self.delay_line.put(self.acquisition_time, data)
+                    data = self.delay_line.get(self.data_time)
+                    self.acquisition_time = self.data_time - self.delay_line.delay
+                self.data = data
+                if self.frame_bus and data:
+                    self.publish_frame(data, self.acquisition_time)
+            self.poll_latency.observe(self.data_time - start)
+            if self.acquisition_time != previous_time:
+                self.ingest_latency.observe(self.data_time - self.acquisition_time)
+            with self.frame_condition:
+                self.frame_number += 1
+                self.frame_condition.notify_all()
+            wake_time = time.perf_counter() + self.polling_interval
+            if self.udp_receiver:
+                if self.udp_receiver.wait(self.polling_interval):
+                    continue
+            else:
+                time.sleep(self.polling_interval)
+            self.lateness.observe(max(0.0, time.perf_counter() - wake_time))
     
+    def publish_frame(self, data, timestamp):
+        """ Publish processed frame with peaks into the frame bus. Called under the lock, the bus has one writer.
+
+        :param data: tuple (left, right, mono)
+        :param timestamp: acquisition time (performance counter seconds)
+        """
+        left, right, mono = [v or 0.0 for v in data]
+        for i, v in enumerate((left, right)):
+            if v >= self.peaks[i]:
+                self.peaks[i] = v
+                self.peak_times[i] = timestamp
+            else:
+                fall = timestamp - self.peak_times[i] - PEAK_HOLD_TIME
+                if fall > 0:
+                    self.peaks[i] = max(v, self.peaks[i] - PEAK_DECAY_RATE * fall)
+                    self.peak_times[i] = timestamp - PEAK_HOLD_TIME
+
+        self.frame_bus.write(timestamp, left, right, mono, self.peaks[0], self.peaks[1])
+
     def get_value(self):
         """ Get data depending on the data source type. """ 
                
@@ -251,8 +393,11 @@ class DataSource(object):
         while True:
             try:
                 data = os.read(self.pipe, self.pipe_size)
+                self.pipe_bytes.inc(len(data))
                 if len(data) != 0:
                     latest_data = [data[0], data[1], data[2], data[3]]
+                    if self.pipe_timestamp and len(data) == self.pipe_size:
+                        self.value_time = PIPE_TIMESTAMP_FORMAT.unpack_from(data, 4)[0]
                 time.sleep(self.pipe_polling_inerval)
             except:
                 break
@@ -260,11 +405,77 @@ class DataSource(object):
         return latest_data
 
     def get_http_value(self):
-        """ Fetch HTTP value """
+        """ Fetch HTTP value. Timestamped frames are played out when they are due. """
 
         with self.lock:
+            now = time.perf_counter()
+            while self.http_frames and self.http_frames[0][0] <= now:
+                self.http_data_time, self.http_data = self.http_frames.popleft()
+            self.value_time = self.http_data_time
             return self.http_data
 
+    def set_http_data(self, left, right, mono):
+        """ Set the latest value received by HTTP. Pending timestamped frames are discarded.
+
+        :param left: left channel value
+        :param right: right channel value
+        :param mono: mono value
+        """
+        with self.lock:
+            self.http_frames.clear()
+            self.http_data = (left, right, mono)
+            self.http_data_time = time.perf_counter()
+
+    def put_http_frames(self, frames):
+        """ Add batch of frames received by HTTP.
+
+        The producer timestamps are mapped to the local clock so that the first frame
+        of the batch is due immediately and the others follow with the producer timing.
+
+        :param frames: list of tuples (timestamp in seconds or None, left, right, mono) ordered by timestamp
+        """
+        if not frames:
+            return
+
+        if frames[0][0] == None:
+            t, left, right, mono = frames[-1]
+            self.set_http_data(left, right, mono)
+            return
+
+        with self.lock:
+            offset = time.perf_counter() - frames[0][0]
+            if self.http_clock_offset == None or abs(offset - self.http_clock_offset) > CLOCK_RESYNC_THRESHOLD:
+                self.http_clock_offset = offset
+            else:
+                self.http_clock_offset += (offset - self.http_clock_offset) * CLOCK_OFFSET_SMOOTHING
+
+            for t, left, right, mono in frames:
+                if t != None:
+                    self.http_frames.append((t + self.http_clock_offset, (left, right, mono)))
+
+    def get_udp_value(self):
+        """ Get the latest value received by UDP """
+
+        self.value_time = self.udp_receiver.get_data_time()
+        return self.udp_receiver.get_data()
+
+    def get_shm_value(self):
+        """ Get the latest value published in shared memory """
+
+        data = self.shm_reader.read()
+        self.value_time = data[0] or None
+        return data[1:]
+
+    def get_bus_value(self):
+        """ Get the latest frame published by the acquisition process into the frame bus """
+
+        frame = self.bus_reader.latest()
+        if frame == None:
+            return (0.0, 0.0, 0.0)
+
+        self.value_time = frame[0]
+        return frame[1:4]
+
     def get_pipe_value(self):
         """ Get signal from the named pipe. """
 
@@ -0,0 +1,106 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+from threading import Lock
+
+class DelayLine(object):
+    """ Delays timestamped frames by the fixed time.
+
+    Frames are kept in the preallocated ring which holds delay / interval frames plus two,
+    so the memory doesn't depend on the run time. A frame which isn't at least 'interval'
+    newer than the previous one (repeated value of the source, faster source) is not stored,
+    so the ring always covers the whole delay. Sources with their own timestamps (UDP, shared memory)
+    repeat the timestamp when there is no new value since the previous poll. The output for the provided
+    time is interpolated between the two frames around that time minus the delay.
+    The ring is guarded by its own lock, frames can be added and read by different threads.
+    """
+
+    def __init__(self, delay, interval):
+        """ Initializer
+
+        :param delay: delay (seconds)
+        :param interval: the shortest interval between stored frames (seconds)
+        """
+        self.delay = delay
+        self.interval = interval
+        self.size = int(delay / interval) + 2
+        self.times = [0.0] * self.size
+        self.values = [None] * self.size
+        self.count = 0
+        self.newest = -1
+        self.lock = Lock()
+
+    def put(self, timestamp, value):
+        """ Add frame unless it's less than the interval newer than the newest frame
+
+        :param timestamp: acquisition time (seconds)
+        :param value: tuple with values
+        :return: True - frame stored, False - frame skipped
+        """
+        with self.lock:
+            if self.count and timestamp - self.times[self.newest] < self.interval:
+                return False
+
+            self.newest = (self.newest + 1) % self.size
+            self.times[self.newest] = timestamp
+            self.values[self.newest] = value
+            if self.count < self.size:
+                self.count += 1
+            return True
+
+    def get(self, now):
+        """ Get the delayed frame
+
+        :param now: current time (seconds)
+        :return: tuple with values interpolated for the time now - delay,
+            the oldest frame if the delay isn't filled yet, None if there are no frames
+        """
+        with self.lock:
+            if self.count == 0:
+                return None
+
+            target = now - self.delay
+            index = self.newest
+            if target >= self.times[index]:
+                return self.values[index]
+
+            for _ in range(self.count - 1):
+                previous = (index - 1) % self.size
+                t = self.times[previous]
+                if t <= target:
+                    return self.interpolate(previous, index, target)
+                index = previous
+
+            return self.values[index]
+
+    def interpolate(self, i, j, target):
+        """ Interpolate between two frames. Called under the lock.
+
+        :param i: index of the older frame
+        :param j: index of the newer frame
+        :param target: time between frames
+        :return: tuple with interpolated values
+        """
+        t0 = self.times[i]
+        t1 = self.times[j]
+        v0 = self.values[i]
+        v1 = self.values[j]
+        if t1 <= t0:
+            return v1
+
+        k = (target - t0) / (t1 - t0)
+        return tuple(a + (b - a) * k if a != None and b != None else b for a, b in zip(v0, v1))
@@ -0,0 +1,158 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import mmap
+import stat
+import struct
+import logging
+import pygame
+
+FBIOGET_VSCREENINFO = 0x4600
+FBIOGET_FSCREENINFO = 0x4602
+
+# struct fb_var_screeninfo (160 bytes): resolution, depth, bit fields of the colors
+VAR_SCREEN_INFO = struct.Struct("=8I12I20I")
+# struct fb_fix_screeninfo with native alignment, the trailing '0L' adds the end padding
+FIX_SCREEN_INFO = struct.Struct("@16sL4I3HIL2IH2H0L")
+FIX_LINE_LENGTH_INDEX = 9
+
+DEFAULT_MASKS = {
+    16: (0xF800, 0x07E0, 0x001F, 0),
+    24: (0xFF0000, 0x00FF00, 0x0000FF, 0),
+    32: (0xFF0000, 0x00FF00, 0x0000FF, 0)
+}
+
+class Framebuffer(object):
+    """ Display output which bypasses SDL.
+
+    The meter is composed in the off-screen surface which has the same pixel format as the framebuffer.
+    Only the updated areas of the surface are copied into the memory mapped framebuffer device.
+    Any regular file can be used instead of the device, in that case the geometry
+    is defined by the screen size and depth.
+    """
+
+    def __init__(self, device, width, height, depth):
+        """ Initializer
+
+        :param device: framebuffer device e.g. /dev/fb1 or regular file
+        :param width: screen width
+        :param height: screen height
+        :param depth: screen depth used for regular files
+        """
+        self.device = device
+        self.fd = os.open(device, os.O_RDWR | os.O_CREAT, 0o644)
+        self.width = self.height = self.depth = self.stride = 0
+        self.masks = None
+
+        if not self.read_device_geometry():
+            self.width = width
+            self.height = height
+            self.depth = depth
+            self.stride = width * ((depth + 7) // 8)
+            self.masks = DEFAULT_MASKS.get(depth, DEFAULT_MASKS[32])
+
+        size = self.stride * self.height
+        if stat.S_ISREG(os.fstat(self.fd).st_mode) and os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+
+        self.map = mmap.mmap(self.fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        self.surface = pygame.Surface((min(width, self.width), min(height, self.height)), 0, self.depth, self.masks)
+        self.bytes_per_pixel = self.surface.get_bytesize()
+        logging.debug("Framebuffer %s: %dx%d, %d bits, stride %d" % (device, self.width, self.height, self.depth, self.stride))
+
+    def read_device_geometry(self):
+        """ Read resolution, pixel format and line length of the framebuffer device
+
+        :return: True - success, False - the file is not a framebuffer device
+        """
+        try:
+            import fcntl
+            var_info = fcntl.ioctl(self.fd, FBIOGET_VSCREENINFO, bytes(VAR_SCREEN_INFO.size))
+            fix_info = fcntl.ioctl(self.fd, FBIOGET_FSCREENINFO, bytes(FIX_SCREEN_INFO.size))
+        except (ImportError, OSError):
+            return False
+
+        v = VAR_SCREEN_INFO.unpack(var_info)
+        self.width, self.height, self.depth = v[0], v[1], v[6]
+        red, green, blue = v[8:11], v[11:14], v[14:17]
+        self.masks = (self.get_mask(red), self.get_mask(green), self.get_mask(blue), 0)
+        self.stride = FIX_SCREEN_INFO.unpack(fix_info)[FIX_LINE_LENGTH_INDEX]
+
+        return True
+
+    def get_mask(self, bitfield):
+        """ Convert framebuffer bit field into the color mask
+
+        :param bitfield: tuple (offset, length, msb_right)
+
+        :return: color mask
+        """
+        offset, length = bitfield[0], bitfield[1]
+        return ((1 << length) - 1) << offset
+
+    def update(self, areas):
+        """ Copy updated areas into the framebuffer
+
+        :param areas: rectangle or list of rectangles, None items are ignored
+        """
+        if not isinstance(areas, list):
+            areas = [areas]
+
+        bounds = self.surface.get_rect()
+        rects = []
+        for a in areas:
+            if a:
+                r = bounds.clip(pygame.Rect(a))
+                if r.w and r.h:
+                    rects.append(r)
+
+        if not rects:
+            return
+
+        buffer = self.surface.get_buffer()
+        source = memoryview(buffer)
+        pitch = self.surface.get_pitch()
+        bpp = self.bytes_per_pixel
+
+        try:
+            for r in rects:
+                if r.x == 0 and r.w == bounds.w and pitch == self.stride:
+                    start = r.y * pitch
+                    end = start + r.h * pitch
+                    self.map[start : end] = source[start : end]
+                    continue
+
+                length = r.w * bpp
+                src = r.y * pitch + r.x * bpp
+                dst = r.y * self.stride + r.x * bpp
+                for _ in range(r.h):
+                    self.map[dst : dst + length] = source[src : src + length]
+                    src += pitch
+                    dst += self.stride
+        finally:
+            source.release()
+            del buffer
+
+    def close(self):
+        """ Unmap and close the framebuffer """
+
+        try:
+            self.map.close()
+            os.close(self.fd)
+        except Exception as e:
+            logging.debug(e)
@@ -0,0 +1,215 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import mmap
+import struct
+import logging
+
+from seqlock import get_path
+
+# Frame bus - ring buffer of processed meter frames in shared memory (little-endian).
+# header (64 bytes):
+#   offset 0: 4s magic 'PMFB', I version, I number of slots, I slot size
+#   offset 16: Q number of frames written so far
+# slot N (40 bytes) starting at offset 64 + N * slot size:
+#   offset 0: Q slot sequence, 2 * frame + 1 while the writer updates the slot, 2 * frame + 2 when it's done
+#   offset 8: d timestamp (CLOCK_MONOTONIC seconds, the same clock as time.perf_counter on Linux)
+#   offset 16: f left, f right, f mono, f peak left, f peak right
+# Frame number F is stored in the slot F % number of slots.
+# The writer updates the slot and then the number of written frames.
+# The reader reads the slot and accepts it if the slot sequence is 2 * F + 2 before and after reading.
+
+MAGIC = b"PMFB"
+VERSION = 1
+HEADER_SIZE = 64
+DEFAULT_SLOTS = 256
+
+HEADER = struct.Struct("<4sIII")
+COUNTER = struct.Struct("<Q")
+COUNTER_OFFSET = 16
+SLOT_SIZE = 40
+SLOT_VALUES = struct.Struct("<d5f")
+SLOT_VALUES_OFFSET = 8
+
+class FrameBusWriter(object):
+    """ Publishes meter frames into the shared memory ring buffer """
+
+    def __init__(self, name, slots=DEFAULT_SLOTS):
+        """ Initializer. Create and map shared memory file
+
+        :param name: file name in /dev/shm or absolute path
+        :param slots: number of frames in the ring buffer
+        """
+        self.path = get_path(name)
+        self.slots = slots
+        size = HEADER_SIZE + slots * SLOT_SIZE
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, slots, SLOT_SIZE)
+        COUNTER.pack_into(self.map, COUNTER_OFFSET, 0)
+        self.frame = 0
+
+    def write(self, timestamp, left, right, mono, peak_left, peak_right):
+        """ Publish frame
+
+        :param timestamp: frame timestamp (performance counter seconds)
+        :param left: left channel value
+        :param right: right channel value
+        :param mono: mono value
+        :param peak_left: left channel peak
+        :param peak_right: right channel peak
+        """
+        offset = HEADER_SIZE + (self.frame % self.slots) * SLOT_SIZE
+        COUNTER.pack_into(self.map, offset, 2 * self.frame + 1)
+        SLOT_VALUES.pack_into(self.map, offset + SLOT_VALUES_OFFSET, timestamp, left, right, mono, peak_left, peak_right)
+        COUNTER.pack_into(self.map, offset, 2 * self.frame + 2)
+        self.frame += 1
+        COUNTER.pack_into(self.map, COUNTER_OFFSET, self.frame)
+
+    def close(self):
+        """ Unmap and remove shared memory file """
+
+        self.map.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+class FrameBusReader(object):
+    """ Reads meter frames from the shared memory ring buffer.
+
+    Any number of readers can consume the same bus. Each reader has its own position.
+    A reader which falls behind by more than the ring size skips the overwritten frames.
+    """
+
+    def __init__(self, name):
+        """ Initializer
+
+        :param name: file name in /dev/shm or absolute path
+        """
+        self.path = get_path(name)
+        self.map = None
+        self.slots = 0
+        self.position = None
+        self.lost = 0
+
+    def open(self):
+        """ Map shared memory file if the writer has created it
+
+        :return: True - mapped, False - not available yet
+        """
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return False
+
+        try:
+            size = os.fstat(fd).st_size
+            if size < HEADER_SIZE:
+                return False
+            self.map = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ)
+        finally:
+            os.close(fd)
+
+        magic, version, slots, slot_size = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION or slot_size != SLOT_SIZE or size < HEADER_SIZE + slots * SLOT_SIZE:
+            logging.debug("Unsupported frame bus file: " + self.path)
+            self.close()
+            return False
+
+        self.slots = slots
+        return True
+
+    def get_written(self):
+        """ Get number of frames written by the writer
+
+        :return: number of frames or None if the bus is not available
+        """
+        if self.map == None and not self.open():
+            return None
+
+        written = COUNTER.unpack_from(self.map, COUNTER_OFFSET)[0]
+        if self.position != None and written < self.position:
+            self.position = None
+        return written
+
+    def read_frame(self, frame):
+        """ Read one frame
+
+        :param frame: frame number
+
+        :return: tuple (timestamp, left, right, mono, peak left, peak right) or None if the slot was overwritten
+        """
+        offset = HEADER_SIZE + (frame % self.slots) * SLOT_SIZE
+        sequence = 2 * frame + 2
+        if COUNTER.unpack_from(self.map, offset)[0] != sequence:
+            return None
+        values = SLOT_VALUES.unpack_from(self.map, offset + SLOT_VALUES_OFFSET)
+        if COUNTER.unpack_from(self.map, offset)[0] != sequence:
+            return None
+        return values
+
+    def read(self):
+        """ Read all frames published since the previous call
+
+        :return: list of tuples (timestamp, left, right, mono, peak left, peak right)
+        """
+        written = self.get_written()
+        if written == None:
+            return []
+
+        if self.position == None:
+            self.position = written
+
+        if written - self.position > self.slots:
+            self.lost += written - self.position - self.slots
+            self.position = written - self.slots
+
+        frames = []
+        while self.position < written:
+            values = self.read_frame(self.position)
+            if values == None:
+                self.lost += 1
+            else:
+                frames.append(values)
+            self.position += 1
+
+        return frames
+
+    def latest(self):
+        """ Read the newest frame without changing the reader position
+
+        :return: tuple (timestamp, left, right, mono, peak left, peak right) or None
+        """
+        written = self.get_written()
+        if not written:
+            return None
+
+        return self.read_frame(written - 1)
+
+    def close(self):
+        """ Unmap shared memory """
+
+        if self.map != None:
+            self.map.close()
+            self.map = None
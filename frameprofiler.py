@@ -0,0 +1,175 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import json
+import signal
+import logging
+
+from threading import Thread
+from tornado.web import RequestHandler
+
+STAGE_EVENTS = 0
+STAGE_RUN = 1
+STAGE_UPDATE = 2
+STAGE_REFRESH = 3
+STAGE_DEPENDENT = 4
+STAGE_TICK = 5
+
+STAGES = ["events", "meter.run", "update.display", "refresh", "dependent", "tick"]
+# frame start and the end of each stage
+MARKS = len(STAGES) + 1
+PERCENTILES = [50, 95, 99]
+TRACE_FILENAME = "peppymeter.trace.json"
+
+class FrameProfiler(object):
+    """ Records the duration of each stage of the display loop.
+
+    The stage end times (perf_counter_ns) are written into the preallocated ring buffer
+    with 'size' slots, one of them belongs to the frame in progress. The ring is read by the web server
+    thread or by the signal handler. The frame in progress and the frames with inconsistent marks are excluded.
+    """
+
+    def __init__(self, size=1024):
+        """ Initializer
+
+        :param size: the number of ring slots, the latest size - 1 frames are reported
+        """
+        self.size = max(size, 2)
+        self.marks = [0] * (self.size * MARKS)
+        self.frames = 0
+        self.offset = 0
+        self.pid = os.getpid()
+
+    def start_frame(self):
+        """ Record frame start """
+
+        self.offset = (self.frames % self.size) * MARKS
+        self.marks[self.offset] = time.perf_counter_ns()
+
+    def mark(self, stage):
+        """ Record the end of the stage. The last stage completes the frame.
+
+        :param stage: stage index
+        """
+        self.marks[self.offset + stage + 1] = time.perf_counter_ns()
+        if stage == STAGE_TICK:
+            self.frames += 1
+
+    def get_frames(self):
+        """ Return completed frames from the oldest to the newest
+
+        :return: list of lists with the frame start and the stage end times (ns)
+        """
+        frames = self.frames
+        marks = list(self.marks)
+        # the slot of the frame in progress is excluded, a frame overwritten while copying is skipped
+        count = min(frames, self.size - 1)
+        result = []
+        for n in range(frames - count, frames):
+            offset = (n % self.size) * MARKS
+            frame = marks[offset : offset + MARKS]
+            if all(frame[i] <= frame[i + 1] for i in range(MARKS - 1)):
+                result.append(frame)
+        return result
+
+    def get_summary(self):
+        """ Return stage percentiles
+
+        :return: dictionary where key - stage name, value - dictionary with percentiles in milliseconds
+        """
+        frames = self.get_frames()
+        summary = {"frames": len(frames)}
+        if not frames:
+            return summary
+
+        for i, name in enumerate(STAGES):
+            durations = sorted(f[i + 1] - f[i] for f in frames)
+            summary[name] = self.get_percentiles(durations)
+        summary["frame"] = self.get_percentiles(sorted(f[-1] - f[0] for f in frames))
+        return summary
+
+    def get_percentiles(self, durations):
+        """ Get nearest-rank percentiles
+
+        :param durations: sorted list of durations (ns)
+        :return: dictionary e.g. {"p50": 1.2, "p95": 3.4, "p99": 5.6} in milliseconds
+        """
+        n = len(durations)
+        result = {}
+        for p in PERCENTILES:
+            index = min(max(-(-p * n // 100) - 1, 0), n - 1)
+            result["p" + str(p)] = round(durations[index] / 1000000, 3)
+        return result
+
+    def get_trace(self):
+        """ Prepare trace in Chrome trace event format (chrome://tracing, Perfetto)
+
+        :return: dictionary with trace events
+        """
+        events = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": 1, "args": {"name": "display loop"}}]
+        for f in self.get_frames():
+            events.append({"name": "frame", "ph": "X", "pid": self.pid, "tid": 1, "ts": f[0] / 1000, "dur": (f[-1] - f[0]) / 1000})
+            for i, name in enumerate(STAGES):
+                events.append({"name": name, "ph": "X", "pid": self.pid, "tid": 1, "ts": f[i] / 1000, "dur": (f[i + 1] - f[i]) / 1000})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, filename=TRACE_FILENAME):
+        """ Write trace into the file
+
+        :param filename: file name
+        """
+        try:
+            with open(filename, "w") as f:
+                json.dump(self.get_trace(), f)
+            logging.debug("Frame trace saved: %s %s" % (filename, self.get_summary()))
+        except Exception as e:
+            logging.debug(e)
+
+    def install_signal_handler(self):
+        """ Dump trace on SIGUSR1. The file is written in a separate thread, the display loop isn't paused. """
+
+        def handler(signum, frame):
+            Thread(target=self.dump, daemon=True).start()
+
+        try:
+            signal.signal(signal.SIGUSR1, handler)
+        except (AttributeError, ValueError) as e:
+            logging.debug("Cannot install frame profiler signal handler: " + str(e))
+
+class FrameProfilerHandler(RequestHandler):
+    """ Returns the frame trace in Chrome trace event format.
+    The query argument 'format=summary' returns stage percentiles instead e.g. /profile/frames?format=summary
+    """
+
+    def initialize(self, peppy_meter):
+        self.profiler = getattr(peppy_meter, "frame_profiler", None)
+
+    def get(self):
+        if not self.profiler:
+            self.set_status(404)
+            return
+
+        if self.get_query_argument("format", "trace") == "summary":
+            data = self.profiler.get_summary()
+        else:
+            data = self.profiler.get_trace()
+
+        self.set_header("Content-Type", "application/json")
+        self.set_header("Cache-Control", "no-cache")
+        self.write(json.dumps(data))
@@ -16,10 +16,16 @@
 # along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
 
 import time
+import logging
 import requests
 
-from threading import Thread
-from configfileparser import HTTP_INTERFACE, TARGET_URL, UPDATE_PERIOD
+from threading import Thread, Event
+from collections import deque
+from metrics import registry
+from configfileparser import HTTP_INTERFACE, TARGET_URL, UPDATE_PERIOD, TIMEOUT, CHANGE_THRESHOLD, HEARTBEAT_PERIOD
+
+# the number of the latest requests used for latency statistics
+LATENCY_HISTORY = 256
 
 class HTTPInterface(object):
     """ HTTP interface class. Send VU Meter data to the provided URL using PUT.
@@ -30,37 +36,134 @@ class HTTPInterface(object):
         mono: 13
     }
     The values change in range 0-100
+
+    The requests are sent using persistent (keep-alive) connection with bounded timeout.
+    The data is sent only if it changed more than 'change.threshold' or when 'heartbeat.period' expired.
+    If the target is slower than 'update.period' the missed frames are dropped.
     """
 
     def __init__(self, config, data_source):
         """ Initializer """
 
         self.data_source = data_source
+        self.stop_event = Event()
+        self.thread = None
+        self.send_latency = registry.histogram("peppymeter_output_send_seconds", "Time to write one frame into the output",
+            labels={"output": "http"})
         self.url = config[HTTP_INTERFACE][TARGET_URL]
         self.update_period = config[HTTP_INTERFACE][UPDATE_PERIOD]
+        self.timeout = config[HTTP_INTERFACE][TIMEOUT]
+        self.change_threshold = config[HTTP_INTERFACE][CHANGE_THRESHOLD]
+        self.heartbeat_period = config[HTTP_INTERFACE][HEARTBEAT_PERIOD]
+        self.session = None
+        self.last_data = None
+        self.last_time = 0
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
+        self.sent = self.unchanged = self.dropped = self.errors = 0
 
     def start_writing(self):
         """ Start writing thread """
 
         self.running = True
-        thread = Thread(target = self.write_data)
-        thread.start()
+        self.stop_event.clear()
+        self.start_output()
+        self.thread = Thread(target = self.write_data)
+        self.thread.start()
+
+    def start_output(self):
+        """ Open HTTP session """
+
+        self.session = requests.Session()
 
     def write_data(self):
         """ Method of the writing thread """
 
+        next_time = time.monotonic()
+
         while self.running:
             v = self.data_source.get_current_data()
             if v:
-                d = {"left": v[0], "right": v[1], "mono": v[2]}
-                try:
-                    requests.put(self.url, json=d)
-                except:
-                    pass
-            time.sleep(self.update_period)
+                start = time.perf_counter()
+                self.write_frame(v)
+                self.send_latency.observe(time.perf_counter() - start)
+
+            next_time += self.update_period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+            else:
+                self.dropped += int(-delay / self.update_period)
+                next_time = time.monotonic()
+
+    def write_frame(self, v):
+        """ Send data if it was changed or heartbeat period expired
+
+        :param v: tuple with left, right and mono values
+        """
+        now = time.monotonic()
+        if not self.is_changed(v) and now - self.last_time < self.heartbeat_period:
+            self.unchanged += 1
+            return
+
+        d = {"left": v[0], "right": v[1], "mono": v[2]}
+        start = time.perf_counter()
+        try:
+            response = self.session.put(self.url, json=d, timeout=self.timeout)
+            self.latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                self.errors += 1
+            else:
+                self.sent += 1
+                self.last_data = v
+                self.last_time = now
+        except Exception as e:
+            self.errors += 1
+            logging.debug(e)
+
+    def is_changed(self, v):
+        """ Check if data changed more than threshold since the last request
+
+        :param v: new data
+        :return: True - changed, False - unchanged
+        """
+        if self.last_data == None:
+            return True
+
+        for new, old in zip(v, self.last_data):
+            if abs(new - old) > self.change_threshold:
+                return True
+
+        return False
+
+    def get_statistics(self):
+        """ Return request statistics
+
+        :return: dictionary with counters and latencies (seconds) of the latest requests
+        """
+        latencies = sorted(self.latencies)
+        s = {
+            "sent": self.sent,
+            "unchanged": self.unchanged,
+            "dropped": self.dropped,
+            "errors": self.errors
+        }
+        if latencies:
+            s["latency.min"] = latencies[0]
+            s["latency.avg"] = sum(latencies) / len(latencies)
+            s["latency.p95"] = latencies[int(len(latencies) * 0.95)]
+            s["latency.max"] = latencies[-1]
+        return s
 
     def stop_writing(self):
         """ Stop writing thread """
 
         self.running = False
-        time.sleep(self.update_period)
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self.stop_output()
+
+    def stop_output(self):
+        """ Close HTTP session """
+
+        self.session.close()
@@ -15,111 +15,226 @@
 # You should have received a copy of the GNU General Public License
 # along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
 
-import time
 import math
 import sys
+import time
 import logging
 
-from threading import Thread
+from threading import Thread, Event
+from metrics import registry
 from configfileparser import I2C_INTERFACE, PORT, LEFT_CHANNEL_ADDRESS, RIGHT_CHANNEL_ADDRESS, \
-    OUTPUT_SIZE, UPDATE_PERIOD
+    OUTPUT_SIZE, UPDATE_PERIOD, OUTPUT_CURVE
+
+CURVE_LINEAR = "linear"
+CURVE_DB = "db"
+# the level range shown by the dB curve, the lowest LED is lit at -DB_RANGE dB
+DB_RANGE = 40.0
+# MCP23017 registers: IODIRA, IODIRB, GPIOA (GPIOB follows in the sequential mode)
+IODIRA = 0x00
+IODIRB = 0x01
+GPIOA = 0x12
+# the number of outputs of one expander (GPIOA + GPIOB)
+MAX_OUTPUT_SIZE = 16
 
 class DummySMBus(object):
-    """ Dummy SMBus class used for development on Windows platform """
+    """ Dummy SMBus class used for development on Windows platform and for testing.
+    All writes are recorded as tuples (address, register, value).
+    """
     
     def __init__(self):
         """ Initializer """
         
-        pass
+        self.writes = []
     
     def write_byte_data(self, address, command, value):
         """ Dummy byte data writer """
         
-        pass
+        self.writes.append((address, command, value))
         
     def write_word_data(self, address, command, value):
         """ Dummy word data writer """
         
-        pass
+        self.writes.append((address, command, value))
+
+    def write_i2c_block_data(self, address, command, values):
+        """ Dummy block data writer """
+
+        self.writes.append((address, command, list(values)))
 
 class I2CInterface(object):
     """ I2C interface class. 
         It writes VU Meter stereo data into the I2C port defined in the configuration file.
         The I2C addresses for the left and right channel should be defined in config.txt. 
         Default values 0x21, 0x20. The property output.size defines the number of bits used
-        for the I2C VU Meter. The default value is 10. For the smaller/larger numbers the
-        bit_patterns array should be modified accordingly.
+        for the I2C VU Meter (up to 16). The first 8 LEDs are connected to GPIOA starting from bit 7,
+        the next LEDs to GPIOB starting from bit 0. The property output.curve defines
+        the mapping of the values: 'linear' or 'db'.
+        The bit patterns for all values are calculated once. Only changed channels are written,
+        both ports of the expander are updated by one block write.
     """    
-    def __init__(self, config, data_source):
-        """ Initializer """
+    def __init__(self, config, data_source, i2c_interface=None):
+        """ Initializer
+
+        :param config: configuration settings
+        :param data_source: data source
+        :param i2c_interface: object with SMBus interface, None - open the configured port
+        """
         
         self.data_source = data_source
+        self.stop_event = Event()
+        self.thread = None
+        self.send_latency = registry.histogram("peppymeter_output_send_seconds", "Time to write one frame into the output",
+            labels={"output": "i2c"})
         
         self.port = config[I2C_INTERFACE][PORT]
         self.left_channel_address = config[I2C_INTERFACE][LEFT_CHANNEL_ADDRESS]
         self.right_channel_address = config[I2C_INTERFACE][RIGHT_CHANNEL_ADDRESS]        
         self.output_size = config[I2C_INTERFACE][OUTPUT_SIZE]
         self.update_period = config[I2C_INTERFACE][UPDATE_PERIOD]
-        
-        self.step = int(100/self.output_size)
-        
-        if "win" in sys.platform:
+        self.curve = config[I2C_INTERFACE][OUTPUT_CURVE]
+
+        if self.output_size > MAX_OUTPUT_SIZE:
+            logging.debug("I2C output size %d reduced to %d" % (self.output_size, MAX_OUTPUT_SIZE))
+            self.output_size = MAX_OUTPUT_SIZE
+        self.byte_count = (self.output_size + 7) // 8
+        
+        if i2c_interface:
+            self.i2c_interface = i2c_interface
+        elif "win" in sys.platform:
             self.i2c_interface = DummySMBus()
         else:
             from smbus import SMBus
             self.i2c_interface = SMBus(self.port)
             
-        self.i2c_interface.write_byte_data(self.left_channel_address, 0x00, 0x00)
-        self.i2c_interface.write_byte_data(self.left_channel_address, 0x01, 0x00)
-        self.i2c_interface.write_byte_data(self.right_channel_address, 0x00, 0x00)
-        self.i2c_interface.write_byte_data(self.right_channel_address, 0x01, 0x00)
+        self.i2c_interface.write_byte_data(self.left_channel_address, IODIRA, 0x00)
+        self.i2c_interface.write_byte_data(self.left_channel_address, IODIRB, 0x00)
+        self.i2c_interface.write_byte_data(self.right_channel_address, IODIRA, 0x00)
+        self.i2c_interface.write_byte_data(self.right_channel_address, IODIRB, 0x00)
         
-        self.bit_patterns = {}
-        self.bit_patterns[10] = 0b10000000
-        self.bit_patterns[20] = 0b11000000
-        self.bit_patterns[30] = 0b11100000
-        self.bit_patterns[40] = 0b11110000
-        self.bit_patterns[50] = 0b11111000
-        self.bit_patterns[60] = 0b11111100
-        self.bit_patterns[70] = 0b11111110
-        self.bit_patterns[80] = 0b11111111
-        self.bit_patterns[90] = 0b111111111
-        self.bit_patterns[100] = 0b1111111111
+        self.bit_patterns = self.get_bit_patterns()
+        self.byte_patterns = [self.get_bytes(p) for p in self.bit_patterns]
+        self.last_patterns = {}
         
         f = "{:0" + str(self.output_size) + "b}"
         self.logging_template = "I2C left: " + f + " right: " + f
+
+    def get_bit_patterns(self):
+        """ Prepare lookup table with bit patterns for the values 0-100
+
+        :return: list of bit patterns
+        """
+        patterns = []
+        for n in range(101):
+            lit = self.get_lit_count(n)
+            pattern = 0
+            for i in range(lit):
+                if i < 8:
+                    pattern |= 1 << (7 - i)
+                else:
+                    pattern |= 1 << i
+            patterns.append(pattern)
+        return patterns
+
+    def get_lit_count(self, n):
+        """ Get the number of lit LEDs for the value
+
+        :param n: value in range 0-100
+        :return: number of LEDs
+        """
+        if n <= 0:
+            return 0
+
+        if self.curve == CURVE_DB:
+            level = (20 * math.log10(n / 100) + DB_RANGE) / DB_RANGE
+        else:
+            level = n / 100
+
+        return min(max(int(math.ceil(level * self.output_size - 1e-9)), 0), self.output_size)
+
+    def get_bytes(self, pattern):
+        """ Split bit pattern into port bytes
+
+        :param pattern: bit pattern
+        :return: list of bytes starting from GPIOA
+        """
+        return [(pattern >> (8 * i)) & 0xFF for i in range(self.byte_count)]
         
     def start_writing(self):
         """ Start writing thread """
         
         self.running = True
-        thread = Thread(target = self.write_data)
-        thread.start()
+        self.stop_event.clear()
+        self.start_output()
+        self.thread = Thread(target = self.write_data)
+        self.thread.start()
         
     def write_data(self):
         """ Method of the writing thread """
         
         while self.running:
             v = self.data_source.get_current_data()
-
             if v:
-                left = self.get_bits(v[0])
-                right = self.get_bits(v[1])
+                start = time.perf_counter()
+                self.write_frame(v)
+                self.send_latency.observe(time.perf_counter() - start)
+            self.stop_event.wait(self.update_period)
+
+    def start_output(self):
+        """ Prepare output. The I2C ports are configured by initializer. """
 
-                logging.debug(self.logging_template.format(left, right))
+        self.last_patterns = {}
 
-                self.i2c_interface.write_word_data(self.left_channel_address, 0x12, left)
-                self.i2c_interface.write_word_data(self.right_channel_address, 0x12, right)
+    def write_frame(self, v):
+        """ Write changed channels into I2C
 
-            time.sleep(self.update_period)
+        :param v: tuple with left, right and mono values
+        """
+        left = self.get_index(v[0])
+        right = self.get_index(v[1])
+
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(self.logging_template.format(self.bit_patterns[left], self.bit_patterns[right]))
+
+        self.write_channel(self.left_channel_address, left)
+        self.write_channel(self.right_channel_address, right)
+
+    def get_index(self, n):
+        """ Get lookup table index for the value. Values are rounded up.
+
+        :param n: data value
+        :return: index in range 0-100
+        """
+        if not n or n <= 0:
+            return 0
+        return min(math.ceil(n), 100)
+
+    def write_channel(self, address, index):
+        """ Write channel if its pattern changed
+
+        :param address: expander address
+        :param index: lookup table index
+        """
+        if self.last_patterns.get(address) == index:
+            return
+
+        self.i2c_interface.write_i2c_block_data(address, GPIOA, self.byte_patterns[index])
+        self.last_patterns[address] = index
     
     def stop_writing(self):
         """ Stop writing thread and nullify values in I2C """
         
         self.running = False
-        time.sleep(self.update_period)
-        self.i2c_interface.write_word_data(self.left_channel_address, 0x12, 0)
-        self.i2c_interface.write_word_data(self.right_channel_address, 0x12, 0)
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self.stop_output()
+
+    def stop_output(self):
+        """ Nullify values in I2C """
+
+        self.last_patterns = {}
+        self.write_channel(self.left_channel_address, 0)
+        self.write_channel(self.right_channel_address, 0)
     
     def get_bits(self, n):
         """ Return bit pattern for the defined value in range 0-100
@@ -127,9 +242,4 @@ class I2CInterface(object):
         :param n: data value
         :return: bit pattern
         """
-        if n == 0:
-            return 0
-        else:
-            k = int(math.ceil(n / self.step)) * self.step
-            v = self.bit_patterns[k]
-            return v
+        return self.bit_patterns[self.get_index(n)]
@@ -0,0 +1,132 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+# damping ratio of the classic VU meter movement (about 1.5% overshoot)
+VU_DAMPING = 0.81
+# natural frequency multiplied by the time to reach 99% of a step for the damping above
+VU_FREQUENCY_FACTOR = 4.03
+# the longest integration step of the ballistic model
+MAX_INTEGRATION_STEP = 0.004
+# the longest time interval handled by the ballistic model in one call
+MAX_TIME_INTERVAL = 0.25
+
+class LinearInterpolator(object):
+    """ Interpolates between the last two timestamped data values.
+
+    The output lags the data by one data interval but changes at the render rate.
+    """
+
+    def __init__(self):
+        """ Initializer """
+
+        self.previous_value = self.value = 0.0
+        self.previous_time = self.time = None
+
+    def update(self, value, timestamp):
+        """ Add new data value
+
+        :param value: new value
+        :param timestamp: the time when the value was received (seconds)
+        """
+        if value == None:
+            value = 0.0
+
+        self.previous_value = self.get_value(timestamp)
+        self.previous_time = self.time
+        self.value = value
+        self.time = timestamp
+
+    def get_value(self, now):
+        """ Get value for the provided time
+
+        :param now: current time (seconds)
+        :return: interpolated value
+        """
+        if self.previous_time == None or self.time == None or now == None:
+            return self.value
+
+        interval = self.time - self.previous_time
+        if interval <= 0:
+            return self.value
+
+        k = (now - self.time) / interval
+        if k >= 1.0:
+            return self.value
+        elif k <= 0.0:
+            return self.previous_value
+
+        return self.previous_value + (self.value - self.previous_value) * k
+
+class BallisticInterpolator(object):
+    """ Mass-spring model of the VU meter needle movement.
+
+    The needle follows the latest data value as an underdamped second order system.
+    """
+
+    def __init__(self, response_time):
+        """ Initializer
+
+        :param response_time: time in seconds to reach 99% of a step change
+        """
+        self.frequency = VU_FREQUENCY_FACTOR / max(response_time, 0.01)
+        self.damping = VU_DAMPING
+        self.target = 0.0
+        self.position = 0.0
+        self.velocity = 0.0
+        self.time = None
+
+    def update(self, value, timestamp):
+        """ Add new data value
+
+        :param value: new value
+        :param timestamp: the time when the value was received (seconds)
+        """
+        if value == None:
+            value = 0.0
+
+        self.get_value(timestamp)
+        self.target = value
+
+    def get_value(self, now):
+        """ Move the needle up to the provided time
+
+        :param now: current time (seconds)
+        :return: needle position
+        """
+        if now == None:
+            return self.position
+
+        if self.time == None:
+            self.time = now
+            return self.position
+
+        interval = min(now - self.time, MAX_TIME_INTERVAL)
+        self.time = now
+        if interval <= 0:
+            return self.position
+
+        steps = int(interval / MAX_INTEGRATION_STEP) + 1
+        dt = interval / steps
+        w = self.frequency
+        c = 2 * self.damping * w
+
+        for _ in range(steps):
+            acceleration = w * w * (self.target - self.position) - c * self.velocity
+            self.velocity += acceleration * dt
+            self.position += self.velocity * dt
+
+        return self.position
@@ -22,6 +22,7 @@ from container import Container
 from configfileparser import *
 from linear import LinearAnimator
 from circular import CircularAnimator
+from interpolator import LinearInterpolator, BallisticInterpolator
 
 class Meter(Container):
     """ The base class for all meters """
@@ -102,10 +103,34 @@ class Meter(Container):
         :param image_name: the name of the indicator image
         """
         img = self.load_image(image_name)
+        img = (img[0], self.prepare_sprite(img[1]))
         r = img[1].get_rect()
         r.x = self.origin_x + x
         r.y = self.origin_y + y
-        self.add_image(img, self.origin_x + x, self.origin_y + y, r)
+        c = self.add_image(img, self.origin_x + x, self.origin_y + y, r)
+        c.blend_flags = self.get_sprite_blend_flags()
+
+    def prepare_sprite(self, image):
+        """ Prepare indicator or needle sprite using utility object (if supported)
+
+        :param image: sprite image
+
+        :return: prepared sprite
+        """
+        prepare = getattr(self.util, "prepare_sprite", None)
+        if prepare:
+            return prepare(image)
+        return image
+
+    def get_sprite_blend_flags(self):
+        """ Get blending flags for prepared sprites
+
+        :return: special flags for the blit method
+        """
+        get_flags = getattr(self.util, "get_sprite_blend_flags", None)
+        if get_flags:
+            return get_flags()
+        return 0
     
     def load_image(self, image_name):
         """ Load image
@@ -185,12 +210,29 @@ class Meter(Container):
         elif self.meter_type == TYPE_CIRCULAR:
             if self.channels == 2:
                 self.left = CircularAnimator(self.data_source, self.components[1], self, self.meter_parameters, needles[0], rects[0],
-                    self.data_source.get_current_left_channel_data, self.meter_parameters[LEFT_ORIGIN_X], self.meter_parameters[LEFT_ORIGIN_Y])
+                    self.data_source.get_current_left_channel_data, self.meter_parameters[LEFT_ORIGIN_X], self.meter_parameters[LEFT_ORIGIN_Y],
+                    self.create_interpolator())
                 self.right = CircularAnimator(self.data_source, self.components[2], self, self.meter_parameters, needles[1], rects[1],
-                    self.data_source.get_current_right_channel_data, self.meter_parameters[RIGHT_ORIGIN_X], self.meter_parameters[RIGHT_ORIGIN_Y])
+                    self.data_source.get_current_right_channel_data, self.meter_parameters[RIGHT_ORIGIN_X], self.meter_parameters[RIGHT_ORIGIN_Y],
+                    self.create_interpolator())
             else:
                 self.mono = CircularAnimator(self.data_source, self.components[1], self, self.meter_parameters, needles[2], rects[2],
-                    self.data_source.get_current_mono_channel_data, self.meter_parameters[MONO_ORIGIN_X], self.meter_parameters[MONO_ORIGIN_Y])
+                    self.data_source.get_current_mono_channel_data, self.meter_parameters[MONO_ORIGIN_X], self.meter_parameters[MONO_ORIGIN_Y],
+                    self.create_interpolator())
+
+    def create_interpolator(self):
+        """ Create needle interpolator defined in the configuration file
+
+        :return: interpolator object or None if interpolation disabled
+        """
+        interpolation = self.meter_config.get(NEEDLE_INTERPOLATION)
+
+        if interpolation == INTERPOLATION_LINEAR:
+            return LinearInterpolator()
+        elif interpolation == INTERPOLATION_BALLISTIC:
+            return BallisticInterpolator(self.meter_config[NEEDLE_RESPONSE_TIME])
+
+        return None
 
     def run (self):
         """ Run the current meter  
@@ -144,12 +144,16 @@ class MeterFactory(object):
         config[NEEDLE_WIDTH] = w
         config[NEEDLE_HEIGHT] = h
         
+        # with the compressed tier the current meter is always kept in the caches, they are moved to that tier on stop
         if self.meter_config[USE_CACHE] and len(self.mono_needle_cache) + len(self.left_needle_cache) < self.meter_config[CACHE_SIZE]:
             config[USE_CACHE] = True
+        elif self.meter_config.get(CACHE_COMPRESSION):
+            config[USE_CACHE] = True
         else:
             config[USE_CACHE] = False
 
-        factory = NeedleFactory(name, needle, config, self.mono_needle_cache, self.mono_rect_cache, self.left_needle_cache, self.left_rect_cache, self.right_needle_cache, self.right_rect_cache)
+        factory = NeedleFactory(name, needle, config, self.mono_needle_cache, self.mono_rect_cache, self.left_needle_cache, self.left_rect_cache,
+            self.right_needle_cache, self.right_rect_cache, meter.prepare_sprite)
         
         if config[CHANNELS] == 2:
             meter.left_needle_sprites = factory.left_needle_sprites
@@ -163,14 +167,14 @@ class MeterFactory(object):
             rc = rect_left.copy()
             rc.x += config[LEFT_ORIGIN_X] - w/2
             rc.y += config[LEFT_ORIGIN_Y] - h
-            meter.add_image(sprites_left, 0, 0, rc)
+            meter.add_image(sprites_left, 0, 0, rc).blend_flags = meter.get_sprite_blend_flags()
 
             sprites_right = meter.right_needle_sprites[0]
             rect_right = meter.right_needle_rects[0]
             rc = rect_right.copy()
             rc.x += config[RIGHT_ORIGIN_X] - w/2
             rc.y += config[RIGHT_ORIGIN_Y] - h
-            meter.add_image(sprites_right, 0, 0, rc)
+            meter.add_image(sprites_right, 0, 0, rc).blend_flags = meter.get_sprite_blend_flags()
         else:
             meter.mono_needle_sprites = factory.mono_needle_sprites
             meter.mono_needle_rects = factory.mono_needle_rects     
@@ -179,7 +183,7 @@ class MeterFactory(object):
             rc = r.copy()
             rc.x += config[MONO_ORIGIN_X] - w/2
             rc.y += config[MONO_ORIGIN_Y] - h
-            meter.add_image(s, 0, 0, rc)
+            meter.add_image(s, 0, 0, rc).blend_flags = meter.get_sprite_blend_flags()
         
         if config[FGR_FILENAME]:
             meter.add_foreground(config[FGR_FILENAME])
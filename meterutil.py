@@ -17,6 +17,15 @@
 
 import pygame
 
+from configfileparser import PREMULTIPLIED_ALPHA
+
+# images with larger share of fully transparent pixels are RLE accelerated
+RLE_TRANSPARENCY = 0.5
+# transparent color of the sprites without alpha channel (16 bpp rendering)
+COLOR_KEY = (255, 0, 255)
+# pixels with lower alpha become transparent in the sprites without alpha channel
+ALPHA_THRESHOLD = 127
+
 class MeterUtil(object):
     """ Utility class """
     
@@ -24,6 +33,8 @@ class MeterUtil(object):
         """ Initializer """
 
         self.image_cache = {}
+        self.meter_config = {}
+        self.PYGAME_SCREEN = None
     
     def load_pygame_image(self, path):
         """ Check if image is in the cache.
@@ -43,7 +54,7 @@ class MeterUtil(object):
             pass
             
         try:            
-            image = pygame.image.load(path).convert_alpha()
+            image = self.prepare_image(pygame.image.load(path))
         except:
             pass
             
@@ -52,4 +63,100 @@ class MeterUtil(object):
             return (path, image)
         else:
             return None
-        
+
+    def prepare_image(self, image):
+        """ Convert image to the display format.
+
+        Images without real transparency are converted without alpha channel.
+        Images with large transparent areas are RLE accelerated.
+
+        :param image: loaded image
+
+        :return: converted image
+        """
+        if not self.has_alpha(image):
+            if self.PYGAME_SCREEN:
+                return image.convert(self.PYGAME_SCREEN)
+            return image.convert()
+
+        image = image.convert_alpha()
+        w, h = image.get_size()
+        visible = pygame.mask.from_surface(image, 0).count()
+        if visible < w * h * (1 - RLE_TRANSPARENCY):
+            image.set_alpha(255, pygame.RLEACCEL)
+
+        return image
+
+    def has_alpha(self, image):
+        """ Check if image has at least one pixel which is not fully opaque
+
+        :param image: image to check
+
+        :return: True - image has transparent pixels, False - image is opaque
+        """
+        if not image.get_flags() & pygame.SRCALPHA:
+            return False
+
+        w, h = image.get_size()
+        return pygame.mask.from_surface(image, 254).count() != w * h
+
+    def is_premultiplied_alpha(self):
+        """ Check if sprites should be stored with premultiplied alpha
+
+        :return: True - use premultiplied alpha, False - use regular alpha blending
+        """
+        return bool(self.meter_config.get(PREMULTIPLIED_ALPHA)) and hasattr(pygame.Surface, "premul_alpha") \
+            and not self.is_low_depth()
+
+    def is_low_depth(self):
+        """ Check if rendering surface has no room for alpha channel e.g. RGB565
+
+        :return: True - rendering surface depth is less than 24 bits
+        """
+        return self.PYGAME_SCREEN != None and self.PYGAME_SCREEN.get_bitsize() < 24
+
+    def prepare_sprite(self, image):
+        """ Prepare needle or indicator sprite for blitting
+
+        :param image: sprite image
+
+        :return: sprite with premultiplied alpha if enabled, 
+            sprite in the rendering surface format with color key for low depth surface,
+            otherwise the same image
+        """
+        if not image.get_flags() & pygame.SRCALPHA:
+            return image
+
+        if self.is_low_depth():
+            return self.get_color_key_sprite(image)
+        elif self.is_premultiplied_alpha():
+            return image.premul_alpha()
+
+        return image
+
+    def get_color_key_sprite(self, image):
+        """ Convert sprite with alpha channel into the rendering surface format.
+        Transparent pixels are replaced by color key.
+
+        :param image: sprite with alpha channel
+
+        :return: RLE accelerated sprite with color key
+        """
+        sprite = image.convert(self.PYGAME_SCREEN)
+        transparent = pygame.mask.from_surface(image, ALPHA_THRESHOLD)
+        transparent.invert()
+        transparent.to_surface(sprite, setcolor=COLOR_KEY, unsetcolor=None)
+        sprite.set_colorkey(COLOR_KEY, pygame.RLEACCEL)
+
+        return sprite
+
+    def get_sprite_blend_flags(self):
+        """ Get blending flags for sprites prepared by prepare_sprite
+
+        :return: special flags for the blit method
+        """
+        if self.is_premultiplied_alpha():
+            return pygame.BLEND_PREMULTIPLIED
+
+        return 0
+
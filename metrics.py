@@ -0,0 +1,266 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+from bisect import bisect_left
+from threading import RLock
+
+TYPE_COUNTER = "counter"
+TYPE_GAUGE = "gauge"
+TYPE_HISTOGRAM = "histogram"
+
+# bucket upper bounds for durations (seconds)
+TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# bucket upper bounds for the number of updated pixels per frame
+PIXEL_BUCKETS = (0, 1000, 5000, 10000, 25000, 50000, 100000, 250000, 500000, 1000000)
+
+def format_labels(labels):
+    """ Format labels in Prometheus text format
+
+    :param labels: dictionary with labels
+    :return: string like {output="serial"} or empty string
+    """
+    if not labels:
+        return ""
+    items = ['%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in sorted(labels.items())]
+    return "{" + ",".join(items) + "}"
+
+def format_value(value):
+    """ Format sample value
+
+    :param value: number
+    :return: string representation
+    """
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class Counter(object):
+    """ Monotonically increasing counter """
+
+    def __init__(self, labels=None):
+        """ Initializer
+
+        :param labels: dictionary with labels
+        """
+        self.labels = format_labels(labels)
+        self.value = 0
+
+    def inc(self, n=1):
+        """ Increase counter
+
+        :param n: increment
+        """
+        self.value += n
+
+    def get_samples(self, name):
+        """ Return samples
+
+        :param name: metric name
+        :return: list of tuples (sample name with labels, value)
+        """
+        return [(name + self.labels, self.value)]
+
+class Gauge(object):
+    """ Value which can go up and down. The value can be also taken from the callback on export. """
+
+    def __init__(self, labels=None, callback=None):
+        """ Initializer
+
+        :param labels: dictionary with labels
+        :param callback: function without arguments returning the current value
+        """
+        self.labels = format_labels(labels)
+        self.callback = callback
+        self.value = 0
+
+    def set(self, value):
+        """ Set value
+
+        :param value: new value
+        """
+        self.value = value
+
+    def inc(self, n=1):
+        """ Increase value
+
+        :param n: increment
+        """
+        self.value += n
+
+    def dec(self, n=1):
+        """ Decrease value
+
+        :param n: decrement
+        """
+        self.value -= n
+
+    def get_samples(self, name):
+        """ Return samples
+
+        :param name: metric name
+        :return: list of tuples (sample name with labels, value)
+        """
+        value = self.value
+        if self.callback:
+            try:
+                value = self.callback()
+            except Exception:
+                pass
+        return [(name + self.labels, value)]
+
+class Histogram(object):
+    """ Histogram with fixed buckets.
+
+    The bucket counters are allocated once, observe() only increments a list item.
+    Counters are updated without locking, a concurrent export may see a sample
+    which is counted in the bucket but not yet in the sum.
+    """
+
+    def __init__(self, buckets, labels=None):
+        """ Initializer
+
+        :param buckets: sorted bucket upper bounds
+        :param labels: dictionary with labels
+        """
+        self.labels = labels or {}
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """ Add observation
+
+        :param value: observed value
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_samples(self, name):
+        """ Return cumulative bucket samples, sum and count
+
+        :param name: metric name
+        :return: list of tuples (sample name with labels, value)
+        """
+        samples = []
+        total = 0
+        bounds = self.bounds + (float("inf"),)
+        for bound, n in zip(bounds, self.counts):
+            total += n
+            labels = dict(self.labels)
+            labels["le"] = format_value(float(bound))
+            samples.append((name + "_bucket" + format_labels(labels), total))
+        samples.append((name + "_sum" + format_labels(self.labels), self.sum))
+        samples.append((name + "_count" + format_labels(self.labels), self.count))
+        return samples
+
+class MetricsRegistry(object):
+    """ Registry of named metrics.
+
+    A metric is identified by name and labels. Registering the same metric again returns
+    the existing instance, so the objects which are re-created (meters, outputs) keep counting.
+    Each process has its own registry.
+    """
+
+    def __init__(self):
+        """ Initializer """
+
+        self.lock = RLock()
+        self.families = {}
+
+    def counter(self, name, description, labels=None):
+        """ Register counter
+
+        :param name: metric name
+        :param description: help text
+        :param labels: dictionary with labels
+        :return: counter
+        """
+        return self.register(name, description, TYPE_COUNTER, labels, lambda: Counter(labels))
+
+    def gauge(self, name, description, labels=None, callback=None):
+        """ Register gauge
+
+        :param name: metric name
+        :param description: help text
+        :param labels: dictionary with labels
+        :param callback: function returning the current value
+        :return: gauge
+        """
+        gauge = self.register(name, description, TYPE_GAUGE, labels, lambda: Gauge(labels, callback))
+        if callback:
+            gauge.callback = callback
+        return gauge
+
+    def histogram(self, name, description, buckets=TIME_BUCKETS, labels=None):
+        """ Register histogram
+
+        :param name: metric name
+        :param description: help text
+        :param buckets: bucket upper bounds
+        :param labels: dictionary with labels
+        :return: histogram
+        """
+        return self.register(name, description, TYPE_HISTOGRAM, labels, lambda: Histogram(buckets, labels))
+
+    def register(self, name, description, metric_type, labels, factory):
+        """ Find or create metric
+
+        :param name: metric name
+        :param description: help text
+        :param metric_type: metric type
+        :param labels: dictionary with labels
+        :param factory: function creating the new metric
+        :return: metric
+        """
+        key = format_labels(labels)
+        with self.lock:
+            family = self.families.get(name)
+            if family == None:
+                family = {"help": description, "type": metric_type, "metrics": {}}
+                self.families[name] = family
+            elif family["type"] != metric_type:
+                raise ValueError("Metric %s is already registered as %s" % (name, family["type"]))
+
+            metric = family["metrics"].get(key)
+            if metric == None:
+                metric = factory()
+                family["metrics"][key] = metric
+            return metric
+
+    def expose(self):
+        """ Export all metrics in Prometheus text format
+
+        :return: text
+        """
+        lines = []
+        with self.lock:
+            families = [(name, dict(f, metrics=list(f["metrics"].values()))) for name, f in sorted(self.families.items())]
+
+        for name, family in families:
+            lines.append("# HELP %s %s" % (name, family["help"]))
+            lines.append("# TYPE %s %s" % (name, family["type"]))
+            for metric in family["metrics"]:
+                for sample, value in metric.get_samples(name):
+                    lines.append("%s %s" % (sample, format_value(value)))
+        lines.append("")
+        return "\n".join(lines)
+
+registry = MetricsRegistry()
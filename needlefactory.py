@@ -17,11 +17,13 @@
 
 import pygame
 from configfileparser import *
+from metrics import registry
 
 class NeedleFactory(object):
     """ Factory to prepare needle sprites for circular animator """
     
-    def __init__(self, name, image, config, mono_needle_cache, mono_rect_cache, left_needle_cache, left_rect_cache, right_needle_cache, right_rect_cache):
+    def __init__(self, name, image, config, mono_needle_cache, mono_rect_cache, left_needle_cache, left_rect_cache, right_needle_cache, right_rect_cache,
+                 prepare_sprite=None):
         """ Initializer
         
         :param name: meter name
@@ -33,17 +35,24 @@ class NeedleFactory(object):
         :param left_rect_cache: dictionary where key - meter name, value - list of left channel needle sprite rectangles
         :param right_needle_cache: dictionary where key - meter name, value - list of right channel needle sprites
         :param right_rect_cache: dictionary where key - meter name, value - list of right channel needle sprite rectangles
+        :param prepare_sprite: function which prepares rotated sprite for blitting
         """
         self.image = image
         self.config = config
+        self.prepare_sprite = prepare_sprite
+        cache_hits = registry.counter("peppymeter_sprite_cache_hits_total", "Needle sprites taken from the cache")
+        cache_misses = registry.counter("peppymeter_sprite_cache_misses_total", "Needle sprites created because they were not in the cache")
         
         if config[CHANNELS] == 1:
             self.mono_needle_sprites = self.get_cached_object(name, mono_needle_cache)
             self.mono_needle_rects = self.get_cached_object(name, mono_rect_cache)
 
             if len(self.mono_needle_sprites) != 0:
+                cache_hits.inc()
                 return
 
+            cache_misses.inc()
+
             self.create_needle_sprites(self.mono_needle_sprites, self.mono_needle_rects, self.config[DISTANCE],
                 self.config[START_ANGLE], self.config[STOP_ANGLE], False)
 
@@ -57,8 +66,11 @@ class NeedleFactory(object):
             self.right_needle_rects = self.get_cached_object(name, right_rect_cache)
 
             if len(self.left_needle_sprites) != 0:
+                cache_hits.inc()
                 return
 
+            cache_misses.inc()
+
             self.create_needle_sprites(self.left_needle_sprites, self.left_needle_rects, self.config[DISTANCE],
                 self.config[LEFT_START_ANGLE], self.config[LEFT_STOP_ANGLE], self.config[LEFT_NEEDLE_FLIP])
 
@@ -136,6 +148,8 @@ class NeedleFactory(object):
 
         for a in angles:
             i, r = self.rotate_image(image, distance, a)
+            if self.prepare_sprite:
+                i = self.prepare_sprite(i)
             images.append(i)
             rects.append(r)
 
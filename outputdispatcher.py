@@ -0,0 +1,193 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import logging
+
+from threading import Thread, Condition
+from configfileparser import OUTPUT_SERIAL, OUTPUT_HTTP
+from metrics import registry
+
+# outputs which can block on the device or network get their own worker thread
+BLOCKING_OUTPUTS = [OUTPUT_SERIAL, OUTPUT_HTTP]
+# the longest waiting time for the new frame, allows to notice the stop request (seconds)
+FRAME_WAIT_TIMEOUT = 0.5
+# the longest waiting time for the worker thread on stop (seconds)
+STOP_TIMEOUT = 1.0
+
+class OutputSlot(object):
+    """ Output with its rate limit and the slot for one pending frame """
+
+    def __init__(self, name, output, period, blocking):
+        """ Initializer
+
+        :param name: output name
+        :param output: output interface with start_output, write_frame and stop_output methods
+        :param period: the shortest interval between writes (seconds)
+        :param blocking: True - write in the worker thread, False - write in the dispatcher thread
+        """
+        self.name = name
+        self.output = output
+        self.period = period
+        self.blocking = blocking
+        self.next_time = 0
+        self.pending = None
+        self.condition = Condition()
+        self.thread = None
+        self.written = self.replaced = self.errors = 0
+        self.send_latency = registry.histogram("peppymeter_output_send_seconds", "Time to write one frame into the output",
+            labels={"output": name.split(".")[-1]})
+
+    def write(self, v):
+        """ Write frame and count errors
+
+        :param v: tuple with left, right and mono values
+        """
+        try:
+            start = time.perf_counter()
+            self.output.write_frame(v)
+            self.send_latency.observe(time.perf_counter() - start)
+            self.written += 1
+        except Exception as e:
+            self.errors += 1
+            logging.debug(e)
+
+class OutputDispatcher(object):
+    """ Drives all interface outputs from one thread.
+
+    The dispatcher waits for the new data source frame and passes it to each output
+    which is due according to its update period. Fast outputs (I2C, PWM) are written directly.
+    Blocking outputs (serial, HTTP) have a worker thread and a pending slot of depth one:
+    a new frame replaces the frame which the slow output didn't take yet.
+    """
+
+    def __init__(self, data_source):
+        """ Initializer
+
+        :param data_source: data source
+        """
+        self.data_source = data_source
+        self.slots = []
+        self.running = False
+        self.thread = None
+
+    def add_output(self, name, output, period, blocking=None):
+        """ Register output
+
+        :param name: output name e.g. output.serial
+        :param output: output interface
+        :param period: the shortest interval between writes (seconds)
+        :param blocking: True - use worker thread, None - decide by the output name
+        """
+        if blocking == None:
+            blocking = name in BLOCKING_OUTPUTS
+        self.slots.append(OutputSlot(name, output, period, blocking))
+
+    def start(self):
+        """ Start outputs and dispatcher thread """
+
+        self.running = True
+        for slot in self.slots:
+            slot.output.start_output()
+            slot.next_time = 0
+            slot.pending = None
+            if slot.blocking:
+                slot.thread = Thread(target=self.run_worker, args=(slot,))
+                slot.thread.start()
+
+        self.thread = Thread(target=self.dispatch)
+        self.thread.start()
+
+    def dispatch(self):
+        """ Dispatcher thread method """
+
+        frame_number = self.data_source.frame_number
+        while self.running:
+            n = self.data_source.wait_for_frame(frame_number, FRAME_WAIT_TIMEOUT)
+            if n == frame_number or not self.running:
+                continue
+            frame_number = n
+
+            v = self.data_source.get_current_data()
+            if not v:
+                continue
+
+            now = time.monotonic()
+            for slot in self.slots:
+                if now < slot.next_time:
+                    continue
+                slot.next_time = max(slot.next_time + slot.period, now)
+
+                if not slot.blocking:
+                    slot.write(v)
+                    continue
+
+                with slot.condition:
+                    if slot.pending != None:
+                        slot.replaced += 1
+                    slot.pending = v
+                    slot.condition.notify()
+
+    def run_worker(self, slot):
+        """ Worker thread method for blocking output
+
+        :param slot: output slot
+        """
+        while True:
+            with slot.condition:
+                while self.running and slot.pending == None:
+                    slot.condition.wait()
+                if not self.running:
+                    break
+                v = slot.pending
+                slot.pending = None
+
+            slot.write(v)
+
+    def stop(self):
+        """ Stop dispatcher without waiting for the next period and nullify outputs """
+
+        self.running = False
+        with self.data_source.frame_condition:
+            self.data_source.frame_condition.notify_all()
+
+        for slot in self.slots:
+            if slot.thread:
+                with slot.condition:
+                    slot.condition.notify()
+
+        if self.thread:
+            self.thread.join(STOP_TIMEOUT)
+
+        for slot in self.slots:
+            if slot.thread:
+                slot.thread.join(STOP_TIMEOUT)
+                slot.thread = None
+            try:
+                slot.output.stop_output()
+            except Exception as e:
+                logging.debug(e)
+
+    def get_statistics(self):
+        """ Return output counters
+
+        :return: dictionary where key - output name, value - dictionary with counters
+        """
+        s = {}
+        for slot in self.slots:
+            s[slot.name] = {"written": slot.written, "replaced": slot.replaced, "errors": slot.errors}
+        return s
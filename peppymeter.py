@@ -18,6 +18,7 @@
 import pygame
 import os
 import sys
+import time
 import logging
 
 from meterutil import MeterUtil
@@ -28,17 +29,24 @@ from serialinterface import SerialInterface
 from i2cinterface import I2CInterface
 from pwminterface import PWMInterface
 from httpinterface import HTTPInterface
+from outputdispatcher import OutputDispatcher
 from screensavermeter import ScreensaverMeter
+from snapshot import Snapshot
+from remotedisplay import RemoteDisplay
+from metrics import registry, PIXEL_BUCKETS
+from frameprofiler import FrameProfiler, STAGE_EVENTS, STAGE_RUN, STAGE_UPDATE, STAGE_REFRESH, STAGE_DEPENDENT, STAGE_TICK
 from configfileparser import *
 
 class Peppymeter(ScreensaverMeter):
     """ Peppy Meter class """
     
-    def __init__(self, util=None, standalone=False, timer_controlled_random_meter=True, quit_pygame_on_stop=True):
+    def __init__(self, util=None, standalone=False, timer_controlled_random_meter=True, quit_pygame_on_stop=True, overrides=None):
         """ Initializer
         
         :param util: utility object
         :param standalone: True - standalone version, False - part of Peppy player
+        :param overrides: dictionary with configuration values replacing the values from the configuration file.
+            The dictionary values update the configuration sections.
         """
         ScreensaverMeter.__init__(self)
         if util:
@@ -53,10 +61,24 @@ class Peppymeter(ScreensaverMeter):
 
         parser = ConfigFileParser()
         self.util.meter_config = parser.meter_config
+        if overrides:
+            self.apply_overrides(overrides)
         self.util.exit_function = self.exit
         self.outputs = {}
+        self.output_dispatcher = None
         self.timer_controlled_random_meter = timer_controlled_random_meter
         self.dependent = None
+        self.display_surface = None
+        self.framebuffer = None
+        self.snapshot = Snapshot()
+        web = self.util.meter_config[WEB_SERVER]
+        self.remote_display = RemoteDisplay(web[REMOTE_PIXEL_FORMAT], web[REMOTE_COMPRESSION])
+        self.frame_profiler = None
+        if self.util.meter_config[OUTPUT_DISPLAY]:
+            self.init_render_metrics()
+            if self.util.meter_config[FRAME_PROFILER]:
+                self.frame_profiler = FrameProfiler(self.util.meter_config[FRAME_PROFILER_SIZE])
+                self.frame_profiler.install_signal_handler()
         
         if standalone:
             if self.util.meter_config[USE_LOGGING]:
@@ -97,9 +119,25 @@ class Peppymeter(ScreensaverMeter):
         if self.util.meter_config[OUTPUT_HTTP]:
             self.outputs[OUTPUT_HTTP] = HTTPInterface(self.util.meter_config, self.data_source)
 
+        if self.util.meter_config[OUTPUT_DISPATCHER] and self.outputs:
+            self.output_dispatcher = OutputDispatcher(self.data_source)
+            for k, v in self.outputs.items():
+                self.output_dispatcher.add_output(k, v, v.update_period)
+
         self.start_interface_outputs()
         logging.debug("PeppyMeter initialized")
     
+    def apply_overrides(self, overrides):
+        """ Replace configuration values
+
+        :param overrides: dictionary where key - configuration key, value - new value or dictionary for sections
+        """
+        for k, v in overrides.items():
+            if isinstance(v, dict) and isinstance(self.util.meter_config.get(k), dict):
+                self.util.meter_config[k].update(v)
+            else:
+                self.util.meter_config[k] = v
+
     def output_display(self, data_source):
         """ Initialize display
         
@@ -138,6 +176,10 @@ class Peppymeter(ScreensaverMeter):
                 self.util.PYGAME_SCREEN = pygame.display.set_mode((1,1))
             return
         
+        if self.util.meter_config[DISPLAY_BACKEND] == BACKEND_FRAMEBUFFER:
+            self.init_framebuffer(screen_w, screen_h, depth)
+            return
+
         if "win" not in sys.platform:
             if not self.util.meter_config[SDL_ENV][VIDEO_DRIVER] == "dummy":
                 os.environ["SDL_VIDEODRIVER"] = self.util.meter_config[SDL_ENV][VIDEO_DRIVER]
@@ -157,17 +199,120 @@ class Peppymeter(ScreensaverMeter):
                 self.util.PYGAME_SCREEN = pygame.display.set_mode((screen_w, screen_h), pygame.DOUBLEBUF, depth)
         else:
             if self.util.meter_config[SDL_ENV][NO_FRAME]:
-                self.util.PYGAME_SCREEN = pygame.display.set_mode((screen_w, screen_h), pygame.NOFRAME)
+                self.util.PYGAME_SCREEN = pygame.display.set_mode((screen_w, screen_h), pygame.NOFRAME, depth)
             else:
-                self.util.PYGAME_SCREEN = pygame.display.set_mode((screen_w, screen_h))
+                self.util.PYGAME_SCREEN = pygame.display.set_mode((screen_w, screen_h), 0, depth)
+
+        self.util.meter_config[SCREEN_RECT] = pygame.Rect(0, 0, screen_w, screen_h)
+
+        if self.util.PYGAME_SCREEN.get_bitsize() != depth:
+            logging.debug("Display depth " + str(self.util.PYGAME_SCREEN.get_bitsize()) + " bits, rendering depth " + str(depth) + " bits")
+            self.display_surface = self.util.PYGAME_SCREEN
+            self.util.PYGAME_SCREEN = pygame.Surface((screen_w, screen_h), 0, depth)
+
+        self.util.update_display = self.update_display
+
+    def init_framebuffer(self, screen_w, screen_h, depth):
+        """ Initialize direct framebuffer output. SDL is used without video output.
 
+        :param screen_w: screen width
+        :param screen_h: screen height
+        :param depth: screen depth used if framebuffer device doesn't provide it
+        """
+        from framebuffer import Framebuffer
+
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        pygame.display.init()
+        pygame.font.init()
+        pygame.display.set_mode((1, 1))
+
+        self.framebuffer = Framebuffer(self.util.meter_config[SDL_ENV][FRAMEBUFFER_DEVICE], screen_w, screen_h, depth)
+        self.util.PYGAME_SCREEN = self.framebuffer.surface
         self.util.meter_config[SCREEN_RECT] = pygame.Rect(0, 0, screen_w, screen_h)
+        self.util.update_display = self.update_display
+
+    def update_display(self, areas):
+        """ Flush updated areas to the display
+
+        :param areas: rectangle or list of rectangles to update
+        """
+        self.remote_display.publish(self.util.PYGAME_SCREEN, areas)
+
+        if self.framebuffer:
+            self.framebuffer.update(areas)
+            return
+
+        if self.display_surface:
+            if not isinstance(areas, list):
+                areas = [areas]
+            for r in areas:
+                if r:
+                    self.display_surface.blit(self.util.PYGAME_SCREEN, r, r)
+
+        pygame.display.update(areas)
     
+    def init_render_metrics(self):
+        """ Register render metrics. Only the process with the display output has them. """
+
+        self.frame_time = registry.histogram("peppymeter_frame_seconds", "Time to render and flush one frame")
+        self.frames_rendered = registry.counter("peppymeter_frames_rendered_total", "Frames with updated areas")
+        self.frames_skipped = registry.counter("peppymeter_frames_skipped_total", "Frames without updated areas")
+        self.dirty_pixels = registry.histogram("peppymeter_dirty_pixels", "Updated pixels per rendered frame", PIXEL_BUCKETS)
+        self.render_lateness = registry.histogram("peppymeter_thread_lateness_seconds", "Delay of the thread wake-up after the scheduled time",
+            labels={"thread": "render"})
+        self.latency = {}
+        for stage in ["publish_render", "render_flush", "end_to_end"]:
+            self.latency[stage] = registry.histogram("peppymeter_latency_seconds", "Latency between pipeline stages", labels={"stage": stage})
+
+    def count_frame(self, areas, start, data_times, render_time, flush_time):
+        """ Update render and latency metrics. The latency is counted for the frames which updated the screen.
+
+        :param areas: rectangle or list of rectangles updated in this frame
+        :param start: frame start time (performance counter seconds)
+        :param data_times: tuple (acquisition time, publishing time) of the data used by the meter
+        :param render_time: the time when the meter finished drawing
+        :param flush_time: the time when the updated areas were flushed to the display
+        """
+        self.frame_time.observe(time.perf_counter() - start)
+
+        if not isinstance(areas, list):
+            areas = [areas]
+        pixels = 0
+        for r in areas:
+            if r:
+                pixels += r.width * r.height
+
+        if pixels == 0:
+            self.frames_skipped.inc()
+        else:
+            self.frames_rendered.inc()
+            self.dirty_pixels.observe(pixels)
+
+            acquisition_time, publish_time = data_times
+            if publish_time != None:
+                self.latency["publish_render"].observe(max(0.0, render_time - publish_time))
+                self.latency["end_to_end"].observe(max(0.0, flush_time - acquisition_time))
+            self.latency["render_flush"].observe(flush_time - render_time)
+
     def start_interface_outputs(self):
         """ Starts writing to interfaces """
 
+        if self.output_dispatcher:
+            self.output_dispatcher.start()
+            return
+
         for v in self.outputs.values():
             v.start_writing()
+
+    def stop_interface_outputs(self):
+        """ Stops writing to interfaces """
+
+        if self.output_dispatcher:
+            self.output_dispatcher.stop()
+            return
+
+        for v in self.outputs.values():
+            v.stop_writing()
     
     def start(self):
         """ Start VU meter. This method called by Peppy Meter to start meter """
@@ -176,10 +321,8 @@ class Peppymeter(ScreensaverMeter):
         if self.util.meter_config[DATA_SOURCE][TYPE] == SOURCE_PIPE or self.use_vu_meter == True:
             self.data_source.start_data_source()
         self.meter.start()
-        pygame.display.update(self.util.meter_config[SCREEN_RECT])
-
-        for v in self.outputs.values():
-            v.start_writing()
+        self.update_display(self.util.meter_config[SCREEN_RECT])
+        self.start_interface_outputs()
 
     def start_display_output(self):
         """ Start thread for graphical VU meter """
@@ -187,14 +330,21 @@ class Peppymeter(ScreensaverMeter):
         pygame.event.clear()
         clock = Clock()
         self.meter.start()
-        pygame.display.update(self.util.meter_config[SCREEN_RECT])
+        self.update_display(self.util.meter_config[SCREEN_RECT])
         running = True
         exit_events = [pygame.MOUSEBUTTONUP]
 
         if pygame.version.ver.startswith("2"):
             exit_events.append(pygame.FINGERUP)
 
+        profiler = self.frame_profiler
+        frame_period = 1.0 / self.util.meter_config[FRAME_RATE]
+        next_deadline = time.perf_counter() + frame_period
+
         while running:
+            if profiler:
+                profiler.start_frame()
+
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
@@ -205,14 +355,40 @@ class Peppymeter(ScreensaverMeter):
                 elif event.type in exit_events and (self.util.meter_config[EXIT_ON_TOUCH] or self.util.meter_config[STOP_DISPLAY_ON_TOUCH]):
                     running = False
 
+            if profiler:
+                profiler.mark(STAGE_EVENTS)
+
+            data_times = self.data_source.get_current_data_times()
+            start = time.perf_counter()
             areas = self.meter.run()
-            pygame.display.update(areas)
+            render_time = time.perf_counter()
+            if profiler:
+                profiler.mark(STAGE_RUN)
+
+            self.update_display(areas)
+            flush_time = time.perf_counter()
+            self.snapshot.capture(self.util.PYGAME_SCREEN, areas)
+            if profiler:
+                profiler.mark(STAGE_UPDATE)
+
             self.refresh()
+            if profiler:
+                profiler.mark(STAGE_REFRESH)
 
             if self.dependent:
                 self.dependent()
 
+            self.count_frame(areas, start, data_times, render_time, flush_time)
+            if profiler:
+                profiler.mark(STAGE_DEPENDENT)
+
             clock.tick(self.util.meter_config[FRAME_RATE])
+            # the clock schedules the wake-up one frame period after the previous tick
+            now = time.perf_counter()
+            self.render_lateness.observe(max(0.0, now - next_deadline))
+            next_deadline = now + frame_period
+            if profiler:
+                profiler.mark(STAGE_TICK)
 
         if self.util.meter_config[STOP_DISPLAY_ON_TOUCH]:
             self.meter.stop()
@@ -225,8 +401,7 @@ class Peppymeter(ScreensaverMeter):
         """ Stop meter animation. """
 
         if not self.use_vu_meter:
-            for v in self.outputs.values():
-                v.stop_writing()
+            self.stop_interface_outputs()
 
             self.data_source.stop_data_source()
 
@@ -252,10 +427,12 @@ class Peppymeter(ScreensaverMeter):
     def exit(self):
         """ Exit program """
         
-        for v in self.outputs.values():
-            v.stop_writing()
+        self.stop_interface_outputs()
         pygame.quit()
 
+        if self.framebuffer:
+            self.framebuffer.close()
+
         if hasattr(self, "malloc_trim"):
             self.malloc_trim()
 
@@ -271,10 +448,15 @@ class Peppymeter(ScreensaverMeter):
 if __name__ == "__main__":
     """ This is called by stand-alone PeppyMeter """
 
+    if ConfigFileParser().meter_config[RUN_MODE] == RUN_MODE_MULTIPROCESS:
+        from pipeline import Pipeline
+        Pipeline().run()
+        sys.exit(0)
+
     pm = Peppymeter(standalone=True)
     source = pm.util.meter_config[DATA_SOURCE][TYPE]
 
-    if source == SOURCE_HTTP:
+    if source == SOURCE_HTTP or pm.util.meter_config[WEB_SERVER][ENABLED]:
         try:
             f = open(os.devnull, 'w')
             sys.stdout = sys.stderr = f
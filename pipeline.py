@@ -0,0 +1,214 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import signal
+import logging
+import threading
+import multiprocessing
+
+from configfileparser import *
+from datasource import SOURCE_HTTP, SOURCE_BUS
+from seqlock import get_path
+
+STAGE_ACQUISITION = "acquisition"
+STAGE_RENDER = "render"
+STAGE_OUTPUTS = "outputs"
+
+INTERFACE_OUTPUTS = [OUTPUT_SERIAL, OUTPUT_I2C, OUTPUT_PWM, OUTPUT_HTTP]
+
+# the period of checking the stage processes (seconds)
+SUPERVISION_PERIOD = 0.5
+# the delay before restarting crashed stage, doubled after each crash up to the maximum (seconds)
+RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 30.0
+# the restart delay is reset if the stage was running longer than this time (seconds)
+STABLE_TIME = 60.0
+# the time to wait for the stage process after terminate (seconds)
+STOP_TIMEOUT = 3.0
+
+def get_overrides(stage, config):
+    """ Prepare configuration overrides for the stage
+
+    :param stage: stage name
+    :param config: meter configuration
+
+    :return: dictionary with overrides
+    """
+    bus = config[DATA_SOURCE][BUS_NAME]
+    overrides = {}
+
+    if stage == STAGE_ACQUISITION:
+        overrides[OUTPUT_DISPLAY] = False
+        overrides[DATA_SOURCE] = {PUBLISH_NAME: bus}
+    else:
+        overrides[DATA_SOURCE] = {TYPE: SOURCE_BUS, BUS_NAME: bus, PUBLISH_NAME: "", DELAY: 0}
+
+    if stage != STAGE_OUTPUTS:
+        for output in INTERFACE_OUTPUTS:
+            overrides[output] = False
+    else:
+        overrides[OUTPUT_DISPLAY] = False
+
+    return overrides
+
+def run_stage(stage, overrides):
+    """ Entry point of the stage process
+
+    :param stage: stage name
+    :param overrides: configuration overrides
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if ConfigFileParser().meter_config[USE_LOGGING]:
+        logging.basicConfig(
+            level=logging.NOTSET,
+            format='[%(asctime)s] ' + stage + ' {%(filename)s:%(lineno)d} %(levelname)s - %(message)s',
+            handlers=[logging.FileHandler(filename="peppymeter." + stage + ".log", mode='w')]
+        )
+    else:
+        logging.disable(logging.CRITICAL)
+
+    from peppymeter import Peppymeter
+
+    pm = Peppymeter(standalone=False, overrides=overrides)
+
+    if stage == STAGE_RENDER:
+        pm.init_display()
+        pm.start_display_output()
+        return
+
+    if stage == STAGE_ACQUISITION:
+        if pm.util.meter_config[DATA_SOURCE][TYPE] == SOURCE_HTTP or pm.util.meter_config[WEB_SERVER][ENABLED]:
+            from webserver import WebServer
+            WebServer(pm)
+
+    threading.Event().wait()
+
+class Pipeline(object):
+    """ Runs PeppyMeter as separate processes: acquisition, rendering and interface outputs.
+
+    The acquisition process publishes the data source frames into the frame bus (shared memory ring).
+    The render and outputs processes read the latest frame from the bus.
+    The web server runs in the acquisition process. It has no display, so the snapshot, remote display
+    and frame profiler endpoints are not available and /metrics reports the acquisition metrics.
+    A crashed stage is restarted with backoff.
+    The pipeline stops when the render process exits normally.
+    """
+
+    def __init__(self):
+        """ Initializer """
+
+        self.config = ConfigFileParser().meter_config
+        if self.config[USE_LOGGING]:
+            logging.basicConfig(
+                level=logging.NOTSET,
+                format='[%(asctime)s] {%(filename)s:%(lineno)d} %(levelname)s - %(message)s',
+                handlers=[logging.FileHandler(filename="peppymeter.log", mode='w')]
+            )
+        self.context = multiprocessing.get_context("spawn")
+        self.run_flag = True
+        self.stages = {}
+
+        names = [STAGE_ACQUISITION]
+        if self.config[OUTPUT_DISPLAY]:
+            names.append(STAGE_RENDER)
+        if any(self.config[output] for output in INTERFACE_OUTPUTS):
+            names.append(STAGE_OUTPUTS)
+
+        for name in names:
+            self.stages[name] = {"process": None, "start.time": 0, "delay": RESTART_DELAY, "restart.time": None, "restarts": 0}
+
+    def run(self):
+        """ Start stages and supervise them until stopped """
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for name in self.stages.keys():
+            self.start_stage(name)
+
+        while self.run_flag:
+            for name in self.stages.keys():
+                self.supervise_stage(name)
+            time.sleep(SUPERVISION_PERIOD)
+
+        self.stop_stages()
+
+    def start_stage(self, name):
+        """ Start stage process
+
+        :param name: stage name
+        """
+        stage = self.stages[name]
+        process = self.context.Process(target=run_stage, args=(name, get_overrides(name, self.config)), name="peppymeter-" + name)
+        process.start()
+        stage["process"] = process
+        stage["start.time"] = time.monotonic()
+        stage["restart.time"] = None
+        logging.debug("Started stage %s, pid %d" % (name, process.pid))
+
+    def supervise_stage(self, name):
+        """ Check stage process, schedule and perform restart
+
+        :param name: stage name
+        """
+        stage = self.stages[name]
+        process = stage["process"]
+        now = time.monotonic()
+
+        if process.is_alive():
+            if now - stage["start.time"] > STABLE_TIME:
+                stage["delay"] = RESTART_DELAY
+            return
+
+        if name == STAGE_RENDER and process.exitcode == 0:
+            logging.debug("Render stage finished")
+            self.run_flag = False
+            return
+
+        if stage["restart.time"] == None:
+            stage["restart.time"] = now + stage["delay"]
+            logging.debug("Stage %s exited with code %s, restart in %.1f s" % (name, process.exitcode, stage["delay"]))
+            stage["delay"] = min(stage["delay"] * 2, MAX_RESTART_DELAY)
+        elif now >= stage["restart.time"]:
+            stage["restarts"] += 1
+            self.start_stage(name)
+
+    def stop(self, signum=None, frame=None):
+        """ Stop pipeline. Used as the signal handler. """
+
+        self.run_flag = False
+
+    def stop_stages(self):
+        """ Terminate all stage processes and remove the frame bus """
+
+        processes = [s["process"] for s in self.stages.values() if s["process"] != None]
+        for p in processes:
+            if p.is_alive():
+                p.terminate()
+
+        for p in processes:
+            p.join(STOP_TIMEOUT)
+            if p.is_alive():
+                p.kill()
+
+        try:
+            os.remove(get_path(self.config[DATA_SOURCE][BUS_NAME]))
+        except OSError:
+            pass
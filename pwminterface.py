@@ -19,8 +19,13 @@ import time
 import sys
 import logging
 
-from threading import Thread
-from configfileparser import PWM_INTERFACE, FREQUENCY, GPIO_PIN_LEFT, GPIO_PIN_RIGHT, UPDATE_PERIOD
+from threading import Thread, Event
+from metrics import registry
+from configfileparser import PWM_INTERFACE, FREQUENCY, GPIO_PIN_LEFT, GPIO_PIN_RIGHT, UPDATE_PERIOD, \
+    GAMMA, CHANGE_THRESHOLD, SMOOTHING
+
+# the number of lookup table entries per value unit (0.1 resolution)
+LUT_RESOLUTION = 10
 
 class DummyPWM(object):
     """ Dummy PWM class used for development on Windows platform """
@@ -40,7 +45,7 @@ class DummyPWM(object):
         
         pass
     
-    def stop(self, value):
+    def stop(self, value=None):
         """ Dummy stop """
         
         pass
@@ -49,22 +54,44 @@ class PWMInterface(object):
     """ PWM interface class. 
 
     Can be used with devices controlled by means of PWM signal e.g. LED, gas tubes etc.
+    The values are smoothed (optional) and converted to the duty cycle using precomputed gamma table.
+    The duty cycle is changed only if it differs from the current one more than the change threshold.
     """    
-    def __init__(self, config, data_source):
-        """ Initializer """
+    def __init__(self, config, data_source, gpio=None):
+        """ Initializer
+
+        :param config: configuration settings
+        :param data_source: data source
+        :param gpio: module with RPi.GPIO interface, None - import RPi.GPIO
+        """
         
         self.data_source = data_source
+        self.stop_event = Event()
+        self.thread = None
+        self.send_latency = registry.histogram("peppymeter_output_send_seconds", "Time to write one frame into the output",
+            labels={"output": "pwm"})
+        self.call_counter = registry.counter("peppymeter_pwm_duty_cycle_calls_total", "ChangeDutyCycle calls made by the PWM output")
+        self.skip_counter = registry.counter("peppymeter_pwm_duty_cycle_skipped_total",
+            "Duty cycle changes skipped by the PWM output because they were below the threshold")
         
         self.frequency = config[PWM_INTERFACE][FREQUENCY]
         self.gpio_pin_left = config[PWM_INTERFACE][GPIO_PIN_LEFT]
         self.gpio_pin_right = config[PWM_INTERFACE][GPIO_PIN_RIGHT]        
         self.update_period = config[PWM_INTERFACE][UPDATE_PERIOD]
+        self.change_threshold = config[PWM_INTERFACE][CHANGE_THRESHOLD]
+        self.smoothing = config[PWM_INTERFACE][SMOOTHING]
+        self.duty_cycles = self.get_gamma_table(config[PWM_INTERFACE][GAMMA])
+        self.values = [0.0, 0.0]
+        self.current_duty_cycles = [0.0, 0.0]
+        self.calls = self.skipped = 0
+        self.start_time = time.monotonic()
         
-        if "win" in sys.platform:
+        if "win" in sys.platform and not gpio:
             self.left = DummyPWM()
             self.right = DummyPWM() 
         else:
-            import RPi.GPIO as gpio
+            if not gpio:
+                import RPi.GPIO as gpio
             gpio.setmode(gpio.BCM)
             gpio.setwarnings(False)
             
@@ -75,42 +102,126 @@ class PWMInterface(object):
             self.right = gpio.PWM(self.gpio_pin_right, self.frequency) 
             
         self.logging_template = "PWM left: {0} right: {1}"           
+
+    def get_gamma_table(self, gamma):
+        """ Prepare lookup table converting values 0-100 into duty cycles
+
+        :param gamma: gamma exponent, 1.0 - linear
+        :return: list of duty cycles
+        """
+        size = 100 * LUT_RESOLUTION
+        return [100.0 * (i / size) ** gamma for i in range(size + 1)]
         
     def start_writing(self):
         """ Start writing thread """
         
         self.running = True
-        thread = Thread(target = self.write_data)
-        thread.start()
+        self.stop_event.clear()
+        self.start_output()
+        self.thread = Thread(target = self.write_data)
+        self.thread.start()
         
     def write_data(self):
         """ Method of the writing thread """
         
-        self.left.start(0)
-        self.right.start(0)
-        
         while self.running:
-            time.sleep(self.update_period)
+            self.stop_event.wait(self.update_period)
+            if not self.running:
+                break
             
             v = self.data_source.get_current_data()
             
-            if v == 0:
+            if not v:
                 continue
             
-            logging.debug(v)
-            left = float(int(v[0]))
-            right = float(int(v[1]))
-            
+            start = time.perf_counter()
+            self.write_frame(v)
+            self.send_latency.observe(time.perf_counter() - start)
+
+    def start_output(self):
+        """ Start PWM """
+
+        self.left.start(0)
+        self.right.start(0)
+        self.values = [0.0, 0.0]
+        self.current_duty_cycles = [0.0, 0.0]
+        self.calls = self.skipped = 0
+        self.start_time = time.monotonic()
+
+    def write_frame(self, v):
+        """ Change duty cycle
+
+        :param v: tuple with left, right and mono values
+        """
+        left = self.get_duty_cycle(0, v[0])
+        right = self.get_duty_cycle(1, v[1])
+
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
             logging.debug(self.logging_template.format(left, right))
 
-            self.left.ChangeDutyCycle(left)
-            self.right.ChangeDutyCycle(right)
+        self.change_duty_cycle(self.left, 0, left)
+        self.change_duty_cycle(self.right, 1, right)
+
+    def get_duty_cycle(self, channel, value):
+        """ Smooth value and convert it into duty cycle
+
+        :param channel: channel index
+        :param value: new value in range 0-100
+        :return: duty cycle
+        """
+        if not value or value < 0:
+            value = 0.0
+        elif value > 100:
+            value = 100.0
+
+        if self.smoothing:
+            value = self.values[channel] + (value - self.values[channel]) * (1.0 - self.smoothing)
+        self.values[channel] = value
+
+        return self.duty_cycles[int(value * LUT_RESOLUTION + 0.5)]
+
+    def change_duty_cycle(self, pwm, channel, duty_cycle):
+        """ Change duty cycle if it differs from the current one more than threshold.
+        The change to zero is always written, so the output doesn't stay slightly on in silence.
+
+        :param pwm: PWM object
+        :param channel: channel index
+        :param duty_cycle: new duty cycle
+        """
+        current = self.current_duty_cycles[channel]
+        if duty_cycle == current or (duty_cycle != 0 and abs(duty_cycle - current) <= self.change_threshold):
+            self.skipped += 1
+            self.skip_counter.inc()
+            return
+
+        pwm.ChangeDutyCycle(duty_cycle)
+        self.current_duty_cycles[channel] = duty_cycle
+        self.calls += 1
+        self.call_counter.inc()
+
+    def get_statistics(self):
+        """ Return output counters
+
+        :return: dictionary with the number of duty cycle changes, skipped changes and changes per second
+        """
+        elapsed = time.monotonic() - self.start_time
+        return {
+            "calls": self.calls,
+            "skipped": self.skipped,
+            "calls.per.second": self.calls / elapsed if elapsed > 0 else 0.0
+        }
                 
     def stop_writing(self):
         """ Stop writing thread and stop PWM """
         
         self.running = False
-        time.sleep(self.update_period)
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self.stop_output()
+
+    def stop_output(self):
+        """ Stop PWM """
+
         self.left.stop()
         self.right.stop()
-    
\ No newline at end of file
@@ -0,0 +1,113 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import asyncio
+import logging
+import pygame
+
+from tornado.websocket import websocket_connect
+from remotedisplay import decode, PIXEL_FORMAT_RGB888, RGB565_MASKS
+
+class RemoteClient(object):
+    """ Thin client which shows the screen of the remote PeppyMeter.
+
+    Usage: python3 remoteclient.py ws://host:8001/display
+    """
+
+    def __init__(self, url):
+        """ Initializer
+
+        :param url: remote display URL
+        """
+        self.url = url
+        self.screen = None
+
+    async def run(self):
+        """ Receive frames and update the display until the connection is closed """
+
+        connection = await websocket_connect(self.url)
+        while True:
+            message = await connection.read_message()
+            if message == None:
+                break
+
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    connection.close()
+                    return
+
+            try:
+                self.show(message)
+            except Exception as e:
+                logging.debug(e)
+
+    def show(self, message):
+        """ Draw rectangles of one frame
+
+        :param message: frame message
+        """
+        keyframe, pixel_format, _, size, rects = decode(message)
+
+        if self.screen == None or self.screen.get_size() != size:
+            if not keyframe:
+                return
+            self.screen = pygame.display.set_mode(size)
+
+        areas = []
+        for x, y, w, h, pixels in rects:
+            self.screen.blit(self.get_surface(pixel_format, w, h, pixels), (x, y))
+            areas.append(pygame.Rect(x, y, w, h))
+
+        pygame.display.update(areas)
+
+    def get_surface(self, pixel_format, w, h, pixels):
+        """ Create surface from the rectangle pixels
+
+        :param pixel_format: protocol pixel format
+        :param w: width
+        :param h: height
+        :param pixels: pixel bytes
+
+        :return: surface
+        """
+        if pixel_format == PIXEL_FORMAT_RGB888:
+            return pygame.image.frombytes(pixels, (w, h), "RGB")
+
+        s = pygame.Surface((w, h), 0, 16, RGB565_MASKS)
+        pitch = s.get_pitch()
+        row = w * 2
+        buffer = s.get_buffer()
+        if pitch == row:
+            buffer.write(pixels, 0)
+        else:
+            for i in range(h):
+                buffer.write(pixels[i * row : (i + 1) * row], i * pitch)
+
+        return s
+
+if __name__ == "__main__":
+    """ This is the entry point to the remote display client """
+
+    if len(sys.argv) < 2:
+        print("Usage: python3 remoteclient.py ws://host:port/display")
+        sys.exit(1)
+
+    pygame.display.init()
+    pygame.display.set_caption("PeppyMeter")
+    asyncio.run(RemoteClient(sys.argv[1]).run())
+    pygame.quit()
@@ -0,0 +1,273 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import zlib
+import struct
+import logging
+import pygame
+
+from threading import RLock
+from tornado.ioloop import IOLoop
+from tornado.websocket import WebSocketHandler, WebSocketClosedError
+
+# Remote display protocol. Each WebSocket binary message is one frame (little-endian):
+# header: 4s magic 'PMRD', B version, B flags (bit 0 - keyframe), B pixel format (1 - RGB565, 2 - RGB888),
+#         B reserved, I frame number, H screen width, H screen height, H number of rectangles
+# rectangle: H x, H y, H width, H height, B encoding (0 - raw, 1 - zlib), I payload length, payload
+# payload: width * height pixels, rows from top to bottom without padding
+# A keyframe contains the whole screen. It's sent to the new clients and to the clients which missed frames.
+
+MAGIC = b"PMRD"
+VERSION = 1
+FLAG_KEYFRAME = 1
+PIXEL_FORMAT_RGB565 = 1
+PIXEL_FORMAT_RGB888 = 2
+ENCODING_RAW = 0
+ENCODING_ZLIB = 1
+
+RGB565_MASKS = (0xF800, 0x07E0, 0x001F, 0)
+
+HEADER = struct.Struct("<4sBBBBIHHH")
+RECT_HEADER = struct.Struct("<HHHHBI")
+
+PIXEL_FORMATS = {
+    "rgb565": PIXEL_FORMAT_RGB565,
+    "rgb888": PIXEL_FORMAT_RGB888
+}
+
+# rectangles smaller than this size are not compressed
+MIN_COMPRESSED_SIZE = 256
+# the shortest interval between keyframes for the clients which missed frames (frames)
+KEYFRAME_INTERVAL = 30
+
+class RemoteDisplay(object):
+    """ Streams damaged rectangles of each rendered frame to the thin clients.
+
+    A client which doesn't take the frames fast enough skips them and waits for a keyframe.
+    The keyframe is copied by the render thread only when a waiting client caught up with
+    its pending writes, and not more often than once per KEYFRAME_INTERVAL frames.
+    """
+
+    def __init__(self, pixel_format="rgb565", compression=True):
+        """ Initializer
+
+        :param pixel_format: 'rgb565' or 'rgb888'
+        :param compression: True - compress rectangles using zlib
+        """
+        self.pixel_format = PIXEL_FORMATS.get(pixel_format, PIXEL_FORMAT_RGB565)
+        self.compression = compression
+        self.lock = RLock()
+        self.clients = {}
+        self.keyframe_clients = set()
+        self.keyframe_requested = False
+        self.keyframe_number = None
+        self.loop = None
+        self.frame = 0
+        self.sent_bytes = 0
+
+    def add_client(self, client):
+        """ Add client. Called in the web server thread.
+
+        :param client: WebSocket handler
+        """
+        with self.lock:
+            self.loop = IOLoop.current()
+            self.clients[client] = None
+            self.keyframe_clients.add(client)
+            self.keyframe_requested = True
+            self.keyframe_number = None
+
+    def remove_client(self, client):
+        """ Remove client
+
+        :param client: WebSocket handler
+        """
+        with self.lock:
+            self.clients.pop(client, None)
+            self.keyframe_clients.discard(client)
+
+    def publish(self, screen, areas):
+        """ Called by the render thread after each frame. Copies pixels of the damaged rectangles
+        and passes them to the web server thread for encoding.
+
+        :param screen: rendered screen surface
+        :param areas: rectangle or list of updated rectangles
+        """
+        if not self.clients:
+            return
+
+        if not isinstance(areas, list):
+            areas = [areas]
+
+        bounds = screen.get_rect()
+        rects = []
+        for a in areas:
+            if a:
+                r = bounds.clip(pygame.Rect(a))
+                if r.w and r.h:
+                    rects.append((r, self.get_pixels(screen, r)))
+
+        frame = (self.frame + 1) & 0xFFFFFFFF
+        with self.lock:
+            take_keyframe = self.keyframe_requested and (self.keyframe_number == None or
+                (frame - self.keyframe_number) & 0xFFFFFFFF >= KEYFRAME_INTERVAL)
+            if take_keyframe:
+                self.keyframe_requested = False
+                self.keyframe_number = frame
+            loop = self.loop
+
+        keyframe = None
+        if take_keyframe:
+            keyframe = [(bounds, self.get_pixels(screen, bounds))]
+
+        if not rects and not keyframe:
+            return
+
+        self.frame = frame
+        loop.add_callback(self.send, frame, bounds.size, rects, keyframe)
+
+    def get_pixels(self, screen, rect):
+        """ Copy pixels of the rectangle in the protocol pixel format
+
+        :param screen: screen surface
+        :param rect: rectangle
+
+        :return: pixel bytes
+        """
+        if self.pixel_format == PIXEL_FORMAT_RGB888:
+            return pygame.image.tobytes(screen.subsurface(rect), "RGB")
+
+        s = pygame.Surface(rect.size, 0, 16, RGB565_MASKS)
+        s.blit(screen, (0, 0), rect)
+        pixels = s.get_buffer().raw
+        row = rect.w * 2
+        pitch = s.get_pitch()
+        if pitch != row:
+            pixels = b"".join(pixels[y * pitch : y * pitch + row] for y in range(rect.h))
+
+        return pixels
+
+    def send(self, frame, size, rects, keyframe):
+        """ Encode frame once and write it to all clients. Called in the web server thread.
+
+        :param frame: frame number
+        :param size: screen size
+        :param rects: list of tuples (rectangle, pixels)
+        :param keyframe: list with the whole screen rectangle or None
+        """
+        delta_message = keyframe_message = None
+
+        with self.lock:
+            clients = list(self.clients.items())
+
+        for client, pending in clients:
+            with self.lock:
+                if pending != None and not pending.done():
+                    self.keyframe_clients.add(client)
+                    continue
+
+                waiting = client in self.keyframe_clients
+                if waiting and keyframe == None:
+                    self.keyframe_requested = True
+                    continue
+                self.keyframe_clients.discard(client)
+
+            if waiting:
+                if keyframe_message == None:
+                    keyframe_message = self.encode(frame, size, keyframe, True)
+                message = keyframe_message
+            else:
+                if not rects:
+                    continue
+                if delta_message == None:
+                    delta_message = self.encode(frame, size, rects, False)
+                message = delta_message
+
+            try:
+                future = client.write_message(message, binary=True)
+                with self.lock:
+                    if client in self.clients:
+                        self.clients[client] = future
+                self.sent_bytes += len(message)
+            except WebSocketClosedError:
+                self.remove_client(client)
+            except Exception as e:
+                logging.debug(e)
+
+    def encode(self, frame, size, rects, keyframe):
+        """ Encode frame message
+
+        :param frame: frame number
+        :param size: screen size
+        :param rects: list of tuples (rectangle, pixels)
+        :param keyframe: True - keyframe
+
+        :return: message bytes
+        """
+        flags = FLAG_KEYFRAME if keyframe else 0
+        parts = [HEADER.pack(MAGIC, VERSION, flags, self.pixel_format, 0, frame, size[0], size[1], len(rects))]
+
+        for r, pixels in rects:
+            encoding = ENCODING_RAW
+            if self.compression and len(pixels) >= MIN_COMPRESSED_SIZE:
+                compressed = zlib.compress(pixels, 1)
+                if len(compressed) < len(pixels):
+                    pixels = compressed
+                    encoding = ENCODING_ZLIB
+            parts.append(RECT_HEADER.pack(r.x, r.y, r.w, r.h, encoding, len(pixels)))
+            parts.append(pixels)
+
+        return b"".join(parts)
+
+def decode(message):
+    """ Decode frame message. Used by the clients.
+
+    :param message: message bytes
+
+    :return: tuple (keyframe flag, pixel format, frame number, screen size, list of tuples (x, y, w, h, pixels))
+    """
+    magic, version, flags, pixel_format, _, frame, width, height, count = HEADER.unpack_from(message)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unsupported remote display message")
+
+    offset = HEADER.size
+    rects = []
+    for _ in range(count):
+        x, y, w, h, encoding, length = RECT_HEADER.unpack_from(message, offset)
+        offset += RECT_HEADER.size
+        pixels = message[offset : offset + length]
+        offset += length
+        if encoding == ENCODING_ZLIB:
+            pixels = zlib.decompress(pixels)
+        rects.append((x, y, w, h, pixels))
+
+    return (bool(flags & FLAG_KEYFRAME), pixel_format, frame, (width, height), rects)
+
+class RemoteDisplayHandler(WebSocketHandler):
+    """ WebSocket endpoint for the remote display clients """
+
+    def initialize(self, remote_display):
+        self.remote_display = remote_display
+
+    def check_origin(self, origin):
+        return True
+
+    def open(self):
+        self.remote_display.add_client(self)
+
+    def on_close(self):
+        self.remote_display.remove_client(self)
@@ -0,0 +1,211 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import time
+import json
+import asyncio
+import threading
+
+from threading import Thread, Event, Lock
+from tornado.web import RequestHandler
+
+DEFAULT_DURATION = 5.0
+MAX_DURATION = 60.0
+# sampling interval (seconds)
+DEFAULT_INTERVAL = 0.01
+MIN_INTERVAL = 0.001
+MAX_INTERVAL = 1.0
+# the deepest recorded stack, deeper frames are cut off at the root side
+MAX_DEPTH = 128
+
+class StackSampler(object):
+    """ Statistical profiler. A timer thread takes stacks of all other threads with sys._current_frames().
+
+    The sampled threads are not paused except for the time the sampler holds the interpreter lock.
+    The sampling time is measured and reported as overhead (fraction of the capture duration).
+    The result is in the collapsed stack format: 'thread;outer;...;inner count' per line.
+    """
+
+    def __init__(self, duration=DEFAULT_DURATION, interval=DEFAULT_INTERVAL):
+        """ Initializer
+
+        :param duration: capture duration (seconds)
+        :param interval: sampling interval (seconds)
+        """
+        self.interval = min(max(interval, MIN_INTERVAL), MAX_INTERVAL)
+        self.duration = min(max(duration, self.interval), MAX_DURATION)
+        self.stacks = {}
+        self.labels = {}
+        self.thread_names = {}
+        self.samples = 0
+        self.sampling_time = 0.0
+        self.elapsed = 0.0
+        self.stop_event = Event()
+
+    def run(self):
+        """ Take samples until the duration expires or stop is called """
+
+        own_id = threading.get_ident()
+        start = time.perf_counter()
+        end = start + self.duration
+
+        while not self.stop_event.is_set():
+            t = time.perf_counter()
+            if t >= end:
+                break
+            self.sample(own_id)
+            self.sampling_time += time.perf_counter() - t
+            self.stop_event.wait(self.interval)
+
+        self.elapsed = time.perf_counter() - start
+
+    def sample(self, own_id):
+        """ Take one sample of all threads except the sampler
+
+        :param own_id: sampler thread ID
+        """
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+
+            stack = []
+            while frame != None and len(stack) < MAX_DEPTH:
+                stack.append(self.get_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(self.get_thread_name(thread_id))
+            stack.reverse()
+
+            key = ";".join(stack)
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+
+    def get_label(self, code):
+        """ Get function label. Labels are cached by the code object.
+
+        :param code: code object
+        :return: label e.g. run (meter.py:237)
+        """
+        label = self.labels.get(code)
+        if label == None:
+            label = "%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+            label = label.replace(";", ":")
+            self.labels[code] = label
+        return label
+
+    def get_thread_name(self, thread_id):
+        """ Get thread name
+
+        :param thread_id: thread ID
+        :return: thread name
+        """
+        name = self.thread_names.get(thread_id)
+        if name == None:
+            for t in threading.enumerate():
+                self.thread_names[t.ident] = t.name.replace(";", ":")
+            name = self.thread_names.setdefault(thread_id, "thread-" + str(thread_id))
+        return name
+
+    def stop(self):
+        """ Stop capture """
+
+        self.stop_event.set()
+
+    def get_collapsed(self):
+        """ Return stacks in collapsed format for flame graph tools
+
+        :return: text with one stack per line
+        """
+        lines = ["%s %d" % (stack, n) for stack, n in sorted(self.stacks.items())]
+        lines.append("")
+        return "\n".join(lines)
+
+    def get_overhead(self):
+        """ Return sampling overhead
+
+        :return: fraction of the capture time spent in sampling
+        """
+        if self.elapsed <= 0:
+            return 0.0
+        return self.sampling_time / self.elapsed
+
+class SamplerHandler(RequestHandler):
+    """ Runs the stack sampler and returns collapsed stacks e.g. /profile/sample?seconds=10&interval=0.005
+    The query argument 'format=json' returns stacks with the sampling statistics.
+    The capture is limited to MAX_DURATION seconds and MAX_INTERVAL interval. Only one capture runs at a time.
+    """
+
+    lock = Lock()
+
+    def initialize(self):
+        self.sampler = None
+
+    async def get(self):
+        try:
+            duration = float(self.get_query_argument("seconds", str(DEFAULT_DURATION)))
+            interval = float(self.get_query_argument("interval", str(DEFAULT_INTERVAL)))
+        except ValueError:
+            self.set_status(400)
+            return
+
+        if duration <= 0 or duration > MAX_DURATION or interval <= 0 or interval > MAX_INTERVAL:
+            self.set_status(400)
+            self.write("seconds must be in range (0, %s], interval in range (0, %s]" % (MAX_DURATION, MAX_INTERVAL))
+            return
+
+        if not SamplerHandler.lock.acquire(blocking=False):
+            self.set_status(409)
+            return
+
+        try:
+            sampler = self.sampler = StackSampler(duration, interval)
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+
+            def run():
+                try:
+                    sampler.run()
+                finally:
+                    loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+            Thread(target=run, name="stack-sampler", daemon=True).start()
+            await future
+        finally:
+            SamplerHandler.lock.release()
+
+        self.set_header("Cache-Control", "no-cache")
+        self.set_header("X-Samples", str(sampler.samples))
+        self.set_header("X-Sampling-Overhead", "%.6f" % sampler.get_overhead())
+
+        if self.get_query_argument("format", "collapsed") == "json":
+            self.set_header("Content-Type", "application/json")
+            self.write(json.dumps({
+                "samples": sampler.samples,
+                "duration": sampler.elapsed,
+                "interval": sampler.interval,
+                "sampling.time": sampler.sampling_time,
+                "overhead": sampler.get_overhead(),
+                "stacks": sampler.stacks
+            }))
+        else:
+            self.set_header("Content-Type", "text/plain; charset=utf-8")
+            self.write(sampler.get_collapsed())
+
+    def on_connection_close(self):
+        if self.sampler:
+            self.sampler.stop()
@@ -0,0 +1,175 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import mmap
+import time
+import struct
+import logging
+import tempfile
+
+# Shared memory layout (little-endian, 64 bytes):
+# offset 0: 4s magic 'PMSL', I version
+# offset 8: Q sequence counter, odd while the writer updates the values
+# offset 16: d timestamp (CLOCK_MONOTONIC seconds, the same clock as time.perf_counter on Linux)
+# offset 24: d left, d right, d mono
+# The writer increments the counter, writes the values and increments the counter again.
+# The reader accepts the values if the counter was even and didn't change while reading.
+# Writers in other languages should use release stores for the counter and the reader uses acquire loads.
+
+MAGIC = b"PMSL"
+VERSION = 1
+SIZE = 64
+
+HEADER = struct.Struct("<4sI")
+SEQUENCE = struct.Struct("<Q")
+SEQUENCE_OFFSET = 8
+VALUES = struct.Struct("<4d")
+VALUES_OFFSET = 16
+
+# the reader gives up after this number of attempts and returns the previous values
+MAX_READ_ATTEMPTS = 100
+SHARED_MEMORY_FOLDER = "/dev/shm"
+
+def get_path(name):
+    """ Get path of the shared memory file
+
+    :param name: file name in /dev/shm or absolute path
+
+    :return: file path
+    """
+    if os.path.isabs(name):
+        return name
+
+    folder = SHARED_MEMORY_FOLDER if os.path.isdir(SHARED_MEMORY_FOLDER) else tempfile.gettempdir()
+    return os.path.join(folder, name)
+
+class SeqlockWriter(object):
+    """ Writer for the producers which publishes the latest levels """
+
+    def __init__(self, name):
+        """ Initializer. Create and map shared memory file
+
+        :param name: file name in /dev/shm or absolute path
+        """
+        self.path = get_path(name)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < SIZE:
+                os.ftruncate(fd, SIZE)
+            self.map = mmap.mmap(fd, SIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+
+        self.sequence = SEQUENCE.unpack_from(self.map, SEQUENCE_OFFSET)[0]
+        if self.sequence & 1:
+            self.sequence += 1
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION)
+
+    def write(self, left, right, mono, timestamp=None):
+        """ Publish values
+
+        :param left: left channel value
+        :param right: right channel value
+        :param mono: mono value
+        :param timestamp: value timestamp, None - current time
+        """
+        if timestamp == None:
+            timestamp = time.perf_counter()
+
+        SEQUENCE.pack_into(self.map, SEQUENCE_OFFSET, self.sequence + 1)
+        VALUES.pack_into(self.map, VALUES_OFFSET, timestamp, left, right, mono)
+        self.sequence += 2
+        SEQUENCE.pack_into(self.map, SEQUENCE_OFFSET, self.sequence)
+
+    def close(self):
+        """ Unmap shared memory. The file stays for the readers. """
+
+        self.map.close()
+
+class SeqlockReader(object):
+    """ Lock-free reader of the latest levels. No system calls are made once the file is mapped. """
+
+    def __init__(self, name):
+        """ Initializer
+
+        :param name: file name in /dev/shm or absolute path
+        """
+        self.path = get_path(name)
+        self.map = None
+        self.sequence = None
+        self.values = (None, 0.0, 0.0, 0.0)
+        self.retries = 0
+
+    def open(self):
+        """ Map shared memory file if the writer has created it
+
+        :return: True - mapped, False - not available yet
+        """
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return False
+
+        try:
+            if os.fstat(fd).st_size < SIZE:
+                return False
+            self.map = mmap.mmap(fd, SIZE, mmap.MAP_SHARED, mmap.PROT_READ)
+        finally:
+            os.close(fd)
+
+        magic, version = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            logging.debug("Unsupported shared memory file: " + self.path)
+            self.map.close()
+            self.map = None
+            return False
+
+        return True
+
+    def read(self):
+        """ Read consistent values
+
+        :return: tuple (timestamp, left, right, mono), the previous values if the writer is busy
+        """
+        if self.map == None and not self.open():
+            return self.values
+
+        for _ in range(MAX_READ_ATTEMPTS):
+            s1 = SEQUENCE.unpack_from(self.map, SEQUENCE_OFFSET)[0]
+            if s1 == self.sequence:
+                return self.values
+            if s1 & 1:
+                self.retries += 1
+                continue
+
+            values = VALUES.unpack_from(self.map, VALUES_OFFSET)
+            s2 = SEQUENCE.unpack_from(self.map, SEQUENCE_OFFSET)[0]
+            if s1 == s2:
+                self.sequence = s1
+                self.values = values
+                return values
+            self.retries += 1
+
+        return self.values
+
+    def close(self):
+        """ Unmap shared memory """
+
+        if self.map != None:
+            self.map.close()
+            self.map = None
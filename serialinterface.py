@@ -19,8 +19,24 @@ import time
 import sys
 import logging
 
-from threading import Thread
-from configfileparser import SERIAL_INTERFACE, DEVICE_NAME, BAUD_RATE, INCLUDE_TIME, UPDATE_PERIOD
+from threading import Thread, Event
+from metrics import registry
+from configfileparser import SERIAL_INTERFACE, DEVICE_NAME, BAUD_RATE, INCLUDE_TIME, UPDATE_PERIOD, \
+    FRAME_FORMAT, SEND_ON_CHANGE, CHANGE_THRESHOLD, HEARTBEAT_PERIOD
+
+FORMAT_TEXT = "text"
+FORMAT_BINARY = "binary"
+
+# binary frame: sync byte, left (0-100), right (0-100), checksum (left XOR right)
+SYNC_BYTE = 0xA5
+BINARY_FRAME_SIZE = 4
+MAX_BINARY_VALUE = 100
+# 8N1 - start bit, 8 data bits, stop bit
+BITS_PER_BYTE = 10
+# the shortest update period is the frame transmission time multiplied by this factor
+PACING_HEADROOM = 1.25
+# new frames are dropped if the output buffer holds more frames than this number
+MAX_QUEUED_FRAMES = 2
 
 class DummySerial(object):
     """ Dummy Serial class used for development on Windows platform """
@@ -30,6 +46,8 @@ class DummySerial(object):
         
         self.port = None
         self.baudrate = None
+        self.write_timeout = None
+        self.out_waiting = 0
     
     def open(self):
         """ Dummy open method """
@@ -39,37 +57,81 @@ class DummySerial(object):
     def write(self, data):
         """ Dummy write method """
         
-        pass
+        return len(data)
 
 class SerialInterface():
-    """ Serial Interface class. Provides writing data into serial interface """
+    """ Serial Interface class. Provides writing data into serial interface.
+
+    Text frame: 'l050r060\\n' optionally prefixed with time.
+    Binary frame: sync byte 0xA5, left, right, checksum (left XOR right).
+    The update period is never shorter than the frame transmission time at the configured baud rate.
+    Writes don't block. If the device doesn't take the data fast enough, the new frames are dropped.
+    Frames are never cut, the part of the frame which didn't fit into the output buffer is sent first next time.
+    """
     
-    def __init__(self, config, data_source):
+    def __init__(self, config, data_source, serial_interface=None):
         """ Initializer
         
         :config: configuration settings
         :data_source: data source
+        :serial_interface: serial object with pyserial interface, None - create it
         """
         self.data_source = data_source
+        self.stop_event = Event()
+        self.thread = None
+        self.send_latency = registry.histogram("peppymeter_output_send_seconds", "Time to write one frame into the output",
+            labels={"output": "serial"})
         
-        if "win" in sys.platform:
+        if serial_interface:
+            self.serial_interface = serial_interface
+        elif "win" in sys.platform:
             self.serial_interface = DummySerial()
         else:
             from serial import Serial
             self.serial_interface = Serial()
         
-        self.serial_interface.port = config[SERIAL_INTERFACE][DEVICE_NAME]
-        self.serial_interface.baudrate  = config[SERIAL_INTERFACE][BAUD_RATE]        
-        self.include_time = config[SERIAL_INTERFACE][INCLUDE_TIME]
-        self.update_period = config[SERIAL_INTERFACE][UPDATE_PERIOD]
+        c = config[SERIAL_INTERFACE]
+        self.serial_interface.port = c[DEVICE_NAME]
+        self.serial_interface.baudrate  = c[BAUD_RATE]
+        self.serial_interface.write_timeout = 0
+        self.include_time = c[INCLUDE_TIME]
+        self.frame_format = c[FRAME_FORMAT]
+        self.send_on_change = c[SEND_ON_CHANGE]
+        self.change_threshold = c[CHANGE_THRESHOLD]
+        self.heartbeat_period = c[HEARTBEAT_PERIOD]
+        self.frame_size = self.get_frame_size()
+        self.update_period = max(c[UPDATE_PERIOD], self.get_line_period())
+        self.last_data = None
+        self.last_time = 0
+        self.pending = b""
+        self.start_time = time.monotonic()
+        self.sent = self.unchanged = self.dropped = self.bytes = 0
         self.serial_interface.open()
+
+    def get_frame_size(self):
+        """ Get the size of one frame
+
+        :return: frame size in bytes
+        """
+        if self.frame_format == FORMAT_BINARY:
+            return BINARY_FRAME_SIZE
+        return len(self.get_data(0, 0))
+
+    def get_line_period(self):
+        """ Get the shortest update period which the serial line can carry
+
+        :return: period in seconds
+        """
+        return self.frame_size * BITS_PER_BYTE / self.serial_interface.baudrate * PACING_HEADROOM
         
     def start_writing(self):
         """ Start writing thread """
         
         self.running = True
-        thread = Thread(target = self.write_data)
-        thread.start()
+        self.stop_event.clear()
+        self.start_output()
+        self.thread = Thread(target = self.write_data)
+        self.thread.start()
         
     def write_data(self):
         """ Write data into serial interface """
@@ -77,11 +139,89 @@ class SerialInterface():
         while self.running:
             v = self.data_source.get_current_data()
             if v:
-                data = self.get_data(v[0], v[1])
-                logging.debug("Serial output: " + data.rstrip())
+                start = time.perf_counter()
+                self.write_frame(v)
+                self.send_latency.observe(time.perf_counter() - start)
+            self.stop_event.wait(self.update_period)
+
+    def start_output(self):
+        """ Prepare output. The serial port is opened by initializer. """
+
+        self.last_data = None
+        self.pending = b""
+        self.start_time = time.monotonic()
+
+    def write_frame(self, v):
+        """ Write one frame into serial interface
+
+        :param v: tuple with left, right and mono values
+        """
+        now = time.monotonic()
+        if self.send_on_change and not self.is_changed(v) and now - self.last_time < self.heartbeat_period:
+            self.unchanged += 1
+            return
+
+        self.last_data = v
+        self.last_time = now
+        self.write_bytes(self.get_frame(v[0], v[1]))
+
+    def get_frame(self, left, right):
+        """ Prepare frame in the configured format
+
+        :param left: left channel value
+        :param right: right channel value
+
+        :return: frame bytes
+        """
+        if self.frame_format == FORMAT_BINARY:
+            return self.get_binary_data(left, right)
+
+        data = self.get_data(left, right)
+        logging.debug("Serial output: " + data.rstrip())
+        return data.encode("utf-8")
+
+    def write_bytes(self, data, drop=True):
+        """ Write frame without blocking. Drop the whole frame if the line is saturated.
 
-                self.serial_interface.write(data.encode("utf-8"))
-            time.sleep(self.update_period)
+        :param data: frame bytes
+        :param drop: True - drop the frame if the line is saturated, False - always write the frame
+        """
+        try:
+            if self.pending:
+                self.pending = self.pending[self.write_serial(self.pending):]
+
+            if drop and (self.pending or self.serial_interface.out_waiting > self.frame_size * MAX_QUEUED_FRAMES):
+                self.dropped += 1
+                return
+
+            self.pending += data[self.write_serial(data):]
+            self.sent += 1
+        except Exception as e:
+            self.dropped += 1
+            logging.debug(e)
+
+    def write_serial(self, data):
+        """ Write bytes into serial interface
+
+        :param data: bytes to write
+        :return: the number of written bytes
+        """
+        n = self.serial_interface.write(data)
+        if n == None:
+            n = len(data)
+        self.bytes += n
+        return n
+
+    def is_changed(self, v):
+        """ Check if data changed more than threshold since the last frame
+
+        :param v: new data
+        :return: True - changed, False - unchanged
+        """
+        if self.last_data == None:
+            return True
+
+        return abs(v[0] - self.last_data[0]) > self.change_threshold or abs(v[1] - self.last_data[1]) > self.change_threshold
     
     def get_data(self, left, right):
         """ Prepare data for writing. Include time if enabled.
@@ -93,13 +233,43 @@ class SerialInterface():
         data = "l%03ir%03i\n" % (left, right) 
         if self.include_time:
             data =  time.strftime("%H:%M:%S") + data
-        return data  
+        return data
+
+    def get_binary_data(self, left, right):
+        """ Prepare binary frame
+
+        :left: data for left channel
+        :right: data for right channel
+        :return: frame bytes
+        """
+        left = min(max(int(left + 0.5), 0), MAX_BINARY_VALUE)
+        right = min(max(int(right + 0.5), 0), MAX_BINARY_VALUE)
+        return bytes((SYNC_BYTE, left, right, left ^ right))
+
+    def get_statistics(self):
+        """ Return output counters
+
+        :return: dictionary with counters and average throughput
+        """
+        elapsed = time.monotonic() - self.start_time
+        return {
+            "sent": self.sent,
+            "unchanged": self.unchanged,
+            "dropped": self.dropped,
+            "bytes": self.bytes,
+            "bytes.per.second": self.bytes / elapsed if elapsed > 0 else 0.0
+        }
             
     def stop_writing(self):
         """ Stop writing thread and nullify values in serial interface """
         
         self.running = False
-        time.sleep(self.update_period)
-        data = self.get_data(0, 0)              
-        self.serial_interface.write(data.encode("utf-8"))
-            
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self.stop_output()
+
+    def stop_output(self):
+        """ Nullify values in serial interface """
+
+        self.write_bytes(self.get_frame(0, 0), drop=False)
@@ -0,0 +1,160 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import logging
+import pygame
+
+from threading import Thread, Condition
+
+FORMAT_PNG = "png"
+FORMAT_JPEG = "jpg"
+MIN_SCALE = 0.1
+
+class Snapshot(object):
+    """ Encodes rendered frames into PNG/JPEG images on demand.
+
+    The render thread only checks a flag unless a client asked for a snapshot.
+    In that case the screen is copied and encoded in the encoder thread.
+    Each variant (format, scale) is encoded at most once per rendered frame
+    and the same bytes are shared by all clients waiting for that variant.
+    """
+
+    def __init__(self):
+        """ Initializer """
+
+        self.condition = Condition()
+        self.version = 0
+        self.pending = {}
+        self.cache = {}
+        self.frame = None
+        self.frame_version = 0
+        self.thread = None
+        self.encoded = 0
+
+    def get_variant(self, image_format, scale):
+        """ Normalize requested image variant
+
+        :param image_format: 'png' or 'jpg'
+        :param scale: scale factor of the image
+
+        :return: tuple (format, scale)
+        """
+        if image_format not in (FORMAT_PNG, FORMAT_JPEG):
+            image_format = FORMAT_PNG
+        scale = round(min(1.0, max(MIN_SCALE, scale)), 2)
+        return (image_format, scale)
+
+    def request(self, variant, callback):
+        """ Request encoded image. The callback is called from encoder thread
+        (or immediately if the image of the current frame is already encoded).
+
+        :param variant: tuple (format, scale) created by get_variant
+        :param callback: function which receives image bytes
+        """
+        with self.condition:
+            cached = self.cache.get(variant)
+            if cached and cached[0] == self.version:
+                data = cached[1]
+            else:
+                self.pending.setdefault(variant, []).append(callback)
+                if self.thread == None:
+                    self.thread = Thread(target=self.encode_frames, daemon=True)
+                    self.thread.start()
+                return
+
+        callback(data)
+
+    def get_cached(self, variant):
+        """ Return the latest encoded image of the provided variant
+
+        :param variant: tuple (format, scale)
+        :return: image bytes or None
+        """
+        with self.condition:
+            cached = self.cache.get(variant)
+            return cached[1] if cached else None
+
+    def capture(self, screen, areas):
+        """ Called by the render thread after each frame
+
+        :param screen: rendered screen surface
+        :param areas: updated areas of the frame
+        """
+        if areas and (not isinstance(areas, list) or any(areas)):
+            self.version += 1
+
+        if not self.pending or self.frame != None:
+            return
+
+        with self.condition:
+            self.frame = screen.copy()
+            self.frame_version = self.version
+            self.condition.notify()
+
+    def encode_frames(self):
+        """ Encoder thread """
+
+        while True:
+            with self.condition:
+                while self.frame == None:
+                    self.condition.wait()
+                frame = self.frame
+                version = self.frame_version
+                pending = self.pending
+                self.pending = {}
+
+            for variant, callbacks in pending.items():
+                cached = self.cache.get(variant)
+                if cached and cached[0] == version:
+                    data = cached[1]
+                else:
+                    data = self.encode(frame, variant)
+                    with self.condition:
+                        self.cache[variant] = (version, data)
+
+                for callback in callbacks:
+                    try:
+                        callback(data)
+                    except Exception as e:
+                        logging.debug(e)
+
+            with self.condition:
+                self.frame = None
+
+    def encode(self, frame, variant):
+        """ Encode frame
+
+        :param frame: copy of the screen
+        :param variant: tuple (format, scale)
+
+        :return: image bytes
+        """
+        image_format, scale = variant
+        if scale != 1.0:
+            w, h = frame.get_size()
+            if frame.get_bitsize() < 24:
+                f = pygame.Surface((w, h), 0, 24)
+                f.blit(frame, (0, 0))
+                frame = f
+            frame = pygame.transform.smoothscale(frame, (max(1, int(w * scale)), max(1, int(h * scale))))
+
+        f = io.BytesIO()
+        pygame.image.save(frame, f, "snapshot." + image_format)
+        self.encoded += 1
+
+        return f.getvalue()
@@ -0,0 +1,73 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+
+from tornado.web import RequestHandler
+from snapshot import FORMAT_JPEG
+
+# the time to wait for the next rendered frame (seconds)
+SNAPSHOT_TIMEOUT = 1.0
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    FORMAT_JPEG: "image/jpeg"
+}
+
+class SnapshotHandler(RequestHandler):
+    """ Returns the rendered meter as PNG or JPEG image.
+    The query argument 'scale' (0.1-1.0) defines downscaled variant e.g. /snapshot.jpg?scale=0.5
+    """
+
+    def initialize(self, peppy_meter):
+        self.snapshot = getattr(peppy_meter, "snapshot", None)
+
+    async def get(self, image_format):
+        if not self.snapshot:
+            self.set_status(404)
+            return
+
+        try:
+            scale = float(self.get_query_argument("scale", "1"))
+        except ValueError:
+            self.set_status(400)
+            return
+
+        variant = self.snapshot.get_variant(image_format, scale)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def set_result(data):
+            if not future.done():
+                future.set_result(data)
+
+        self.snapshot.request(variant, lambda data: loop.call_soon_threadsafe(set_result, data))
+
+        try:
+            data = await asyncio.wait_for(future, SNAPSHOT_TIMEOUT)
+        except asyncio.TimeoutError:
+            logging.debug("Snapshot timeout, no rendered frames")
+            data = self.snapshot.get_cached(variant)
+
+        if not data:
+            self.set_status(503)
+            return
+
+        self.set_header("Content-Type", CONTENT_TYPES[variant[0]])
+        self.set_header("Cache-Control", "no-cache")
+        self.write(data)
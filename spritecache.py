@@ -0,0 +1,264 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import zlib
+import logging
+import pygame
+
+from queue import Queue
+from threading import Thread, Condition
+from collections import OrderedDict
+from metrics import registry
+
+# fastest zlib level, needle sprites are mostly transparent and compress well anyway
+COMPRESSION_LEVEL = 1
+
+ENTRY_SPRITES = 0
+ENTRY_RECTS = 1
+ENTRY_ALIAS = 2
+
+class CompressedSpriteCache(object):
+    """ Cache tier which keeps needle sprites of idle meters compressed in RAM.
+
+    The sprites of the stopped meter are moved from the needle caches (hot tier) into this cache.
+    The sprites are compressed in the background thread, so the meter switch doesn't wait for it.
+    When the meter is selected again its sprites are restored into the needle caches.
+    The compressed copy is kept, so the meter is compressed only once.
+    That is much faster than rotating the needle image for all angles again.
+    The cache keeps up to 'size' meters, the least recently used meter is evicted.
+    """
+
+    def __init__(self, size=20):
+        """ Initializer
+
+        :param size: the maximum number of compressed meters
+        """
+        self.size = size
+        self.meters = OrderedDict()
+        self.pending = {}
+        self.compressing = None
+        self.condition = Condition()
+        self.queue = Queue()
+        self.thread = None
+        self.statistics = {}
+        self.evictions = 0
+        self.eviction_counter = registry.counter("peppymeter_sprite_cache_evictions_total",
+            "Meters removed from the sprite cache tier (hot - moved to the compressed tier or dropped, compressed - dropped)",
+            labels={"tier": "compressed"})
+
+    def compress(self, name, caches):
+        """ Move meter sprites and rectangles from the caches into the compressed cache
+
+        :param name: meter name
+        :param caches: list of caches e.g. mono, left, right needle and rectangle caches. Key - meter name, value - list
+        """
+        with self.condition:
+            if name in self.meters or name in self.pending:
+                for cache in caches:
+                    cache.pop(name, None)
+                return
+
+        entries = []
+        for cache in caches:
+            items = cache.get(name)
+            if items == None:
+                entries.append(None)
+                continue
+
+            alias = self.get_alias(items, caches, name, len(entries))
+            if alias != None:
+                entries.append((ENTRY_ALIAS, alias))
+            elif len(items) and isinstance(items[0], pygame.Surface):
+                entries.append((ENTRY_SPRITES, items))
+            else:
+                entries.append((ENTRY_RECTS, items))
+
+        if not any(e != None and e[0] == ENTRY_SPRITES for e in entries):
+            return
+
+        for cache in caches:
+            cache.pop(name, None)
+
+        with self.condition:
+            self.pending[name] = entries
+
+        if self.thread == None:
+            self.thread = Thread(target=self.run_compression, name="sprite-compression", daemon=True)
+            self.thread.start()
+        self.queue.put(name)
+
+    def run_compression(self):
+        """ Compression thread method """
+
+        while True:
+            name = self.queue.get()
+            with self.condition:
+                entries = self.pending.get(name)
+                if entries == None:
+                    continue
+                self.compressing = name
+
+            try:
+                self.compress_entries(name, entries)
+            except Exception as e:
+                logging.debug(e)
+            finally:
+                with self.condition:
+                    self.pending.pop(name, None)
+                    self.compressing = None
+                    self.condition.notify_all()
+
+    def compress_entries(self, name, entries):
+        """ Compress sprites of one meter and evict the least recently used meters
+
+        :param name: meter name
+        :param entries: list of cache entries
+        """
+        start = time.perf_counter()
+        compressed_entries = []
+        raw_size = compressed_size = 0
+
+        for entry in entries:
+            if entry == None or entry[0] != ENTRY_SPRITES:
+                compressed_entries.append(entry)
+                continue
+
+            compressed = []
+            for sprite in entry[1]:
+                c = self.compress_surface(sprite)
+                raw_size += c[5]
+                compressed_size += len(c[6])
+                compressed.append(c)
+            compressed_entries.append((ENTRY_SPRITES, compressed))
+
+        with self.condition:
+            if name not in self.pending:
+                return
+            self.meters[name] = compressed_entries
+            s = self.statistics.setdefault(name, {})
+            s["raw.size"] = raw_size
+            s["compressed.size"] = compressed_size
+            s["compression.time"] = time.perf_counter() - start
+
+            while len(self.meters) > self.size:
+                evicted, _ = self.meters.popitem(last=False)
+                self.statistics.pop(evicted, None)
+                self.evictions += 1
+                self.eviction_counter.inc()
+                logging.debug("Evicted compressed sprites of meter %s" % evicted)
+
+        logging.debug("Compressed sprites of meter %s: %d -> %d bytes in %.1f ms" % (name, raw_size, compressed_size, s["compression.time"] * 1000))
+
+    def restore(self, name, caches):
+        """ Restore meter sprites and rectangles into the caches
+
+        :param name: meter name
+        :param caches: list of caches in the same order as for the compress method
+
+        :return: True - sprites restored, False - meter not found in the compressed cache
+        """
+        with self.condition:
+            while self.compressing == name:
+                self.condition.wait()
+
+            entries = self.pending.pop(name, None)
+            if entries != None:
+                for cache, entry in zip(caches, entries):
+                    if entry != None:
+                        cache[name] = entry[1] if entry[0] != ENTRY_ALIAS else entries[entry[1]][1]
+                logging.debug("Restored sprites of meter %s before compression" % name)
+                return True
+
+            entries = self.meters.get(name)
+            if entries == None:
+                return False
+            self.meters.move_to_end(name)
+
+        start = time.perf_counter()
+        restored = []
+
+        for cache, entry in zip(caches, entries):
+            if entry == None:
+                items = None
+            elif entry[0] == ENTRY_ALIAS:
+                items = restored[entry[1]]
+            elif entry[0] == ENTRY_SPRITES:
+                items = [self.decompress_surface(c) for c in entry[1]]
+            else:
+                items = entry[1]
+
+            if items != None:
+                cache[name] = items
+            restored.append(items)
+
+        s = self.statistics.setdefault(name, {})
+        s["decompression.time"] = time.perf_counter() - start
+        logging.debug("Restored sprites of meter %s in %.1f ms" % (name, s["decompression.time"] * 1000))
+
+        return True
+
+    def get_alias(self, items, caches, name, index):
+        """ Find the same list in the previous caches (e.g. left and right needles are the same)
+
+        :param items: list of sprites or rectangles
+        :param caches: list of caches
+        :param name: meter name
+        :param index: index of the current cache
+
+        :return: index of the cache with the same list or None
+        """
+        for i in range(index):
+            if caches[i].get(name) is items:
+                return i
+        return None
+
+    def compress_surface(self, surface):
+        """ Compress surface keeping its pixel format
+
+        :param surface: surface to compress
+
+        :return: tuple with surface size, flags, depth, masks, color key, raw size and compressed pixels
+        """
+        pixels = surface.get_buffer().raw
+        flags = surface.get_flags() & (pygame.SRCALPHA | pygame.RLEACCEL)
+        return (surface.get_size(), flags, surface.get_bitsize(), surface.get_masks(), surface.get_colorkey(),
+            len(pixels), zlib.compress(pixels, COMPRESSION_LEVEL))
+
+    def decompress_surface(self, compressed):
+        """ Create surface from compressed pixels
+
+        :param compressed: tuple created by compress_surface
+
+        :return: restored surface
+        """
+        size, flags, depth, masks, color_key, _, pixels = compressed
+        surface = pygame.Surface(size, flags & pygame.SRCALPHA, depth, masks)
+        surface.get_buffer().write(zlib.decompress(pixels), 0)
+
+        if color_key != None:
+            surface.set_colorkey(color_key, flags & pygame.RLEACCEL)
+
+        return surface
+
+    def get_statistics(self):
+        """ Return sizes and timings for all compressed meters
+
+        :return: dictionary where key - meter name, value - dictionary with statistics
+        """
+        with self.condition:
+            return {k: dict(v) for k, v in self.statistics.items()}
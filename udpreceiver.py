@@ -0,0 +1,207 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import socket
+import struct
+import logging
+
+from threading import Thread, RLock, Event
+
+# datagram (little-endian, 24 bytes): I sequence number, d sender timestamp (seconds), f left, f right, f mono
+DATAGRAM = struct.Struct("<Id3f")
+
+SEQUENCE_MODULO = 1 << 32
+SEQUENCE_HALF = 1 << 31
+# the receiver accepts any sequence number after this number of consecutive stale datagrams (sender restart)
+RESYNC_COUNT = 16
+# socket timeout which allows to stop the receiver thread
+RECEIVE_TIMEOUT = 0.5
+# the sender timestamp is used as the acquisition time if the transit time is in the range 0 - MAX_TRANSIT
+# (sender on the same host), otherwise the sender clock is unrelated and the arrival time is used (seconds)
+MAX_TRANSIT = 0.5
+
+class UdpReceiver(object):
+    """ Receives level datagrams and keeps the latest values.
+
+    Datagrams with the sequence number which is not newer than the last accepted one
+    are dropped as reordered, duplicated or stale. Gaps in the sequence are counted as lost datagrams.
+    Interarrival jitter is calculated as in RFC 3550 using the sender timestamps.
+    The consumer can wait for the next accepted datagram instead of polling.
+    """
+
+    def __init__(self, port, address=""):
+        """ Initializer
+
+        :param port: UDP port
+        :param address: local address to bind, empty string - all interfaces
+        """
+        self.port = port
+        self.address = address
+        self.lock = RLock()
+        self.socket = None
+        self.thread = None
+        self.event = Event()
+        self.run_flag = False
+        self.data = (0.0, 0.0, 0.0)
+        self.data_time = None
+        self.source_time = None
+        self.sequence = None
+        self.stale_count = 0
+        self.previous_transit = None
+        self.statistics = {"received": 0, "accepted": 0, "lost": 0, "stale": 0, "invalid": 0, "jitter": 0.0}
+
+    def start(self):
+        """ Open socket and start receiver thread """
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.address, self.port))
+        self.socket.settimeout(RECEIVE_TIMEOUT)
+        self.run_flag = True
+        self.thread = Thread(target=self.receive)
+        self.thread.daemon = True
+        self.thread.start()
+        logging.debug("UDP receiver started on port %d" % self.port)
+
+    def stop(self):
+        """ Stop receiver thread and wait until the socket is closed """
+
+        self.run_flag = False
+        if self.thread:
+            self.thread.join(RECEIVE_TIMEOUT * 2)
+            self.thread = None
+        self.event.set()
+
+    def wait(self, timeout):
+        """ Wait for the next accepted datagram
+
+        :param timeout: the longest waiting time (seconds)
+        :return: True - new datagram was accepted, False - timeout
+        """
+        received = self.event.wait(timeout)
+        self.event.clear()
+        return received
+
+    def receive(self):
+        """ Thread method """
+
+        while self.run_flag:
+            try:
+                datagram = self.socket.recv(DATAGRAM.size + 1)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                logging.debug(e)
+                break
+
+            self.handle_datagram(datagram, time.perf_counter())
+
+        self.socket.close()
+
+    def handle_datagram(self, datagram, arrival):
+        """ Validate datagram and update the latest values
+
+        :param datagram: datagram bytes
+        :param arrival: arrival time (performance counter seconds)
+        """
+        s = self.statistics
+        s["received"] += 1
+
+        if len(datagram) != DATAGRAM.size:
+            s["invalid"] += 1
+            return
+
+        sequence, timestamp, left, right, mono = DATAGRAM.unpack(datagram)
+
+        if self.sequence != None:
+            gap = (sequence - self.sequence) % SEQUENCE_MODULO
+            if gap == 0 or gap >= SEQUENCE_HALF:
+                s["stale"] += 1
+                self.stale_count += 1
+                if self.stale_count < RESYNC_COUNT:
+                    return
+                self.previous_transit = None
+            else:
+                s["lost"] += gap - 1
+
+        self.stale_count = 0
+        self.sequence = sequence
+
+        transit = arrival - timestamp
+        if self.previous_transit != None:
+            d = abs(transit - self.previous_transit)
+            s["jitter"] += (d - s["jitter"]) / 16
+        self.previous_transit = transit
+
+        with self.lock:
+            self.data = (left, right, mono)
+            self.data_time = arrival
+            self.source_time = timestamp if 0 <= transit <= MAX_TRANSIT else arrival
+        s["accepted"] += 1
+        self.event.set()
+
+    def get_data(self):
+        """ Return the latest values
+
+        :return: tuple (left, right, mono)
+        """
+        with self.lock:
+            return self.data
+
+    def get_data_time(self):
+        """ Return the acquisition time of the latest values
+
+        :return: sender timestamp if it's on the local clock, arrival time otherwise (performance counter seconds)
+        """
+        with self.lock:
+            return self.source_time
+
+    def get_statistics(self):
+        """ Return receiver counters
+
+        :return: dictionary with counters and jitter in seconds
+        """
+        return dict(self.statistics)
+
+class UdpSender(object):
+    """ Helper for the producers which sends level datagrams """
+
+    def __init__(self, host, port):
+        """ Initializer
+
+        :param host: PeppyMeter host
+        :param port: UDP port
+        """
+        self.destination = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sequence = 0
+
+    def send(self, left, right, mono):
+        """ Send one datagram
+
+        :param left: left channel value
+        :param right: right channel value
+        :param mono: mono value
+        """
+        self.socket.sendto(DATAGRAM.pack(self.sequence, time.perf_counter(), left, right, mono), self.destination)
+        self.sequence = (self.sequence + 1) % SEQUENCE_MODULO
+
+    def close(self):
+        """ Close socket """
+
+        self.socket.close()
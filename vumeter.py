@@ -22,7 +22,10 @@ import pygame
 from random import randrange
 from meterfactory import MeterFactory
 from screensavermeter import ScreensaverMeter
-from configfileparser import METER, METER_NAMES, RANDOM_METER_INTERVAL, USE_CACHE, SCREEN_RECT, FRAME_RATE
+from spritecache import CompressedSpriteCache
+from metrics import registry
+from configfileparser import METER, METER_NAMES, RANDOM_METER_INTERVAL, USE_CACHE, SCREEN_RECT, FRAME_RATE, CACHE_COMPRESSION, \
+    CACHE_COMPRESSION_SIZE
 
 class Vumeter(ScreensaverMeter):
     """ VU Meter plug-in. """
@@ -62,6 +65,15 @@ class Vumeter(ScreensaverMeter):
         self.left_rect_cache = {}
         self.right_needle_cache = {}
         self.right_rect_cache = {}
+
+        self.compressed_cache = None
+        if self.util.meter_config.get(CACHE_COMPRESSION):
+            self.compressed_cache = CompressedSpriteCache(self.util.meter_config[CACHE_COMPRESSION_SIZE])
+
+        self.cache_evictions = registry.counter("peppymeter_sprite_cache_evictions_total",
+            "Meters removed from the sprite cache tier (hot - moved to the compressed tier or dropped, compressed - dropped)",
+            labels={"tier": "hot"})
+        registry.gauge("peppymeter_sprite_cache_meters", "Meters in the needle sprite cache", callback=self.get_cached_meters)
     
     def get_meter(self):
         """ Creates meter using meter factory. """  
@@ -81,6 +93,9 @@ class Vumeter(ScreensaverMeter):
             self.util.meter_config[METER] = self.meter_names[self.list_meter_index]
             self.list_meter_index += 1
 
+        if self.compressed_cache:
+            self.compressed_cache.restore(self.util.meter_config[METER], self.get_sprite_caches())
+
         factory = MeterFactory(self.util, self.util.meter_config, self.data_source, self.mono_needle_cache, self.mono_rect_cache, self.left_needle_cache, self.left_rect_cache, self.right_needle_cache, self.right_rect_cache)
         m = factory.create_meter()
 
@@ -121,7 +136,12 @@ class Vumeter(ScreensaverMeter):
         if hasattr(self, "callback_stop"):
             self.callback_stop(self.meter)
 
+        cached_meters = self.get_cached_meters()
+        if self.compressed_cache and (self.random_meter or self.list_meter or not self.util.meter_config[USE_CACHE]):
+            self.compressed_cache.compress(self.util.meter_config[METER], self.get_sprite_caches())
+
         if not self.util.meter_config[USE_CACHE]:
+            self.cache_evictions.inc(self.get_cached_meters())
             del self.mono_needle_cache
             del self.mono_rect_cache
             del self.left_needle_cache
@@ -141,13 +161,37 @@ class Vumeter(ScreensaverMeter):
             self.right_rect_cache = {}
             self.meter = None
 
+        self.cache_evictions.inc(max(0, cached_meters - self.get_cached_meters()))
+
+    def get_cached_meters(self):
+        """ Return the number of meters in the needle sprite cache
+
+        :return: number of meters
+        """
+        return len(self.mono_needle_cache) + len(self.left_needle_cache)
+
+    def get_needle_caches(self):
+        """ Return needle sprite caches
+
+        :return: list of mono, left and right needle caches
+        """
+        return [self.mono_needle_cache, self.left_needle_cache, self.right_needle_cache]
+
+    def get_sprite_caches(self):
+        """ Return needle sprite and rectangle caches
+
+        :return: list of mono, left and right needle caches followed by the rectangle caches
+        """
+        return self.get_needle_caches() + [self.mono_rect_cache, self.left_rect_cache, self.right_rect_cache]
+
     def restart(self):
         """ Restart random meter """
 
         self.stop()
         time.sleep(0.2) # let threads stop
         self.start()
-        pygame.display.update(self.util.meter_config[SCREEN_RECT])
+        update_display = getattr(self.util, "update_display", pygame.display.update)
+        update_display(self.util.meter_config[SCREEN_RECT])
     
     def refresh(self):
         """ Refresh meter. Used to update random meter. """
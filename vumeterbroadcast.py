@@ -0,0 +1,120 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import time
+import struct
+import logging
+
+from tornado.ioloop import PeriodicCallback
+from tornado.websocket import WebSocketHandler, WebSocketClosedError
+from dataframe import pack_frames, FORMAT_FLOAT
+
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+SEQUENCE = struct.Struct("<I")
+
+class Broadcaster(object):
+    """ Broadcasts the current data source frame to all connected WebSocket clients.
+
+    Each frame is encoded once per tick and the same message is written to every client.
+    A client which didn't receive the previous message yet is skipped.
+    The timer runs only while there are connected clients.
+    """
+
+    def __init__(self, data_source, period, message_format):
+        """ Initializer
+
+        :param data_source: data source
+        :param period: broadcast period in seconds
+        :param message_format: 'json' - JSON text messages, 'binary' - sequence number followed by 'f32' frame
+        """
+        self.data_source = data_source
+        self.period = period
+        self.binary = message_format == FORMAT_BINARY
+        self.clients = {}
+        self.timer = None
+        self.sequence = 0
+        self.sent = self.skipped = 0
+
+    def add_client(self, client):
+        """ Add client. Start timer for the first client.
+
+        :param client: WebSocket handler
+        """
+        self.clients[client] = None
+        if self.timer == None:
+            self.timer = PeriodicCallback(self.broadcast, self.period * 1000)
+            self.timer.start()
+
+    def remove_client(self, client):
+        """ Remove client. Stop timer when the last client disconnected.
+
+        :param client: WebSocket handler
+        """
+        self.clients.pop(client, None)
+        if not self.clients and self.timer:
+            self.timer.stop()
+            self.timer = None
+
+    def broadcast(self):
+        """ Encode the current frame and write it to all clients which are ready """
+
+        v = self.data_source.get_current_data()
+        if not v:
+            return
+
+        message = self.encode(v)
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+
+        for client, pending in list(self.clients.items()):
+            if pending != None and not pending.done():
+                self.skipped += 1
+                continue
+            try:
+                self.clients[client] = client.write_message(message, binary=self.binary)
+                self.sent += 1
+            except WebSocketClosedError:
+                self.remove_client(client)
+            except Exception as e:
+                logging.debug(e)
+
+    def encode(self, v):
+        """ Encode frame
+
+        :param v: tuple with left, right and mono values
+        :return: message
+        """
+        if self.binary:
+            return SEQUENCE.pack(self.sequence) + pack_frames([(time.time(), v[0], v[1], v[2])], FORMAT_FLOAT)
+        else:
+            return json.dumps({"seq": self.sequence, "left": v[0], "right": v[1], "mono": v[2]})
+
+class VuMeterBroadcastHandler(WebSocketHandler):
+    """ WebSocket endpoint for the clients which display meter values e.g. dashboards """
+
+    def initialize(self, broadcaster):
+        self.broadcaster = broadcaster
+
+    def check_origin(self, origin):
+        return True
+
+    def open(self):
+        self.broadcaster.add_client(self)
+
+    def on_close(self):
+        self.broadcaster.remove_client(self)
@@ -19,8 +19,19 @@ import json
 import logging
 
 from tornado.web import RequestHandler
+from dataframe import unpack_frames, FORMAT_FLOAT
+
+BINARY_CONTENT_TYPE = "application/octet-stream"
 
 class VuMeterHandler(RequestHandler):
+    """ Receives VU Meter data.
+
+    JSON body: one object {"left": 12, "right": 14, "mono": 13}
+    or a batch - list of objects with optional "timestamp" in milliseconds.
+    Binary body (Content-Type: application/octet-stream): one or more packed frames
+    defined in the dataframe module, the query argument 'format' selects 'f32' (default) or 'u16'.
+    """
+
     def initialize(self, peppy_meter):
         self.data_source = peppy_meter.data_source
 
@@ -29,8 +40,28 @@ class VuMeterHandler(RequestHandler):
             return
 
         try:
-            b = self.request.body.decode("utf-8")
-            d = json.loads(b)
-            self.data_source.http_data = (d["left"], d["right"], d["mono"])
+            content_type = self.request.headers.get("Content-Type", "")
+            if content_type.startswith(BINARY_CONTENT_TYPE):
+                frames = unpack_frames(self.request.body, self.get_query_argument("format", FORMAT_FLOAT))
+                self.data_source.put_http_frames(frames)
+                return
+
+            d = json.loads(self.request.body)
+            if isinstance(d, list):
+                self.data_source.put_http_frames(list(map(self.get_frame, d)))
+            else:
+                self.data_source.set_http_data(d["left"], d["right"], d["mono"])
         except Exception as e:
             logging.debug(e)
+            self.set_status(400)
+
+    def get_frame(self, d):
+        """ Convert JSON object into the frame tuple
+
+        :param d: dictionary with optional timestamp (milliseconds) and values
+        :return: tuple (timestamp in seconds or None, left, right, mono)
+        """
+        t = d.get("timestamp")
+        if t != None:
+            t = t / 1000.0
+        return (t, d["left"], d["right"], d["mono"])
@@ -0,0 +1,171 @@
+# Copyright 2024 PeppyMeter peppy.player@gmail.com
+#
+# This file is part of PeppyMeter.
+#
+# PeppyMeter is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PeppyMeter is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import json
+import struct
+import asyncio
+import logging
+
+from tornado.websocket import WebSocketHandler
+from dataframe import unpack_frames, FORMAT_FLOAT
+
+SEQUENCE = struct.Struct("<I")
+# statistics are sent back to the producer with this period (seconds)
+STATISTICS_PERIOD = 1.0
+
+class VuMeterWebSocketHandler(WebSocketHandler):
+    """ Persistent WebSocket channel for VU Meter data.
+
+    Binary message: uint32 sequence number (little-endian) followed by one or more frames
+    defined in the dataframe module, the query argument 'format' of the connection URL selects 'f32' (default) or 'u16'.
+    JSON message: {"seq": 1, "left": 12, "right": 14, "mono": 13} with optional "timestamp" in milliseconds
+    or {"seq": 1, "frames": [...]} with the list of such objects.
+
+    Messages with sequence number not newer than the previous one are dropped.
+    If the producer sends faster than the maximum rate the handler delays reading of the next message,
+    so the producer is slowed down by TCP flow control.
+    Statistics (rate, lag, dropped messages) are sent back to the producer as JSON text messages.
+    """
+
+    connections = set()
+
+    def initialize(self, peppy_meter, max_rate):
+        """ Initializer
+
+        :param peppy_meter: the reference to the root object
+        :param max_rate: the maximum number of messages per second
+        """
+        self.data_source = peppy_meter.data_source
+        self.min_interval = 1.0 / max_rate if max_rate else 0
+        self.frame_format = FORMAT_FLOAT
+        self.sequence = None
+        self.received = self.dropped = self.errors = 0
+        self.rate = 0.0
+        self.lag = 0.0
+        self.min_delay = None
+        self.next_time = 0
+        self.statistics_time = self.statistics_received = 0
+
+    def check_origin(self, origin):
+        return True
+
+    def open(self):
+        self.frame_format = self.get_query_argument("format", FORMAT_FLOAT)
+        self.statistics_time = time.monotonic()
+        VuMeterWebSocketHandler.connections.add(self)
+        logging.debug("WebSocket producer connected: " + str(self.request.remote_ip))
+
+    def on_close(self):
+        VuMeterWebSocketHandler.connections.discard(self)
+        logging.debug("WebSocket producer disconnected: " + str(self.statistics()))
+
+    async def on_message(self, message):
+        now = time.monotonic()
+
+        try:
+            sequence, frames = self.parse_message(message)
+        except Exception as e:
+            logging.debug(e)
+            self.errors += 1
+            return
+
+        self.received += 1
+        if not self.is_newer(sequence):
+            self.dropped += 1
+        else:
+            self.sequence = sequence
+            self.update_lag(frames[-1][0], now)
+            self.data_source.put_http_frames(frames)
+
+        if now - self.statistics_time >= STATISTICS_PERIOD:
+            self.rate = (self.received - self.statistics_received) / (now - self.statistics_time)
+            self.statistics_time = now
+            self.statistics_received = self.received
+            self.write_message(json.dumps(self.statistics()))
+
+        # backpressure: the next message is not read before the minimum interval expires
+        self.next_time = max(self.next_time + self.min_interval, now)
+        delay = self.next_time - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def parse_message(self, message):
+        """ Parse binary or JSON message
+
+        :param message: message from producer
+
+        :return: tuple (sequence number, list of frames)
+        """
+        if isinstance(message, bytes):
+            sequence = SEQUENCE.unpack_from(message)[0]
+            return (sequence, unpack_frames(memoryview(message)[SEQUENCE.size:], self.frame_format))
+
+        d = json.loads(message)
+        if "frames" in d:
+            frames = [self.get_frame(f) for f in d["frames"]]
+        else:
+            frames = [self.get_frame(d)]
+        return (d["seq"] & 0xFFFFFFFF, frames)
+
+    def get_frame(self, d):
+        """ Convert JSON object into the frame tuple
+
+        :param d: dictionary with optional timestamp (milliseconds) and values
+        :return: tuple (timestamp in seconds or None, left, right, mono)
+        """
+        t = d.get("timestamp")
+        if t != None:
+            t = t / 1000.0
+        return (t, d["left"], d["right"], d["mono"])
+
+    def is_newer(self, sequence):
+        """ Compare sequence numbers using serial number arithmetic (wraps at 2^32)
+
+        :param sequence: sequence number of the new message
+        :return: True - the message is newer than the previous one
+        """
+        if self.sequence == None:
+            return True
+        diff = (sequence - self.sequence) & 0xFFFFFFFF
+        return diff != 0 and diff < 0x80000000
+
+    def update_lag(self, timestamp, now):
+        """ Estimate lag as the current one-way delay above the smallest delay seen on this connection
+
+        :param timestamp: producer timestamp of the latest frame (seconds) or None
+        :param now: local receive time
+        """
+        if timestamp == None:
+            return
+        delay = now - timestamp
+        if self.min_delay == None or delay < self.min_delay or delay - self.min_delay > 60:
+            self.min_delay = delay
+        self.lag = delay - self.min_delay
+
+    def statistics(self):
+        """ Return connection statistics
+
+        :return: dictionary with counters, message rate (per second) and lag (seconds)
+        """
+        return {
+            "received": self.received,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "rate": round(self.rate, 1),
+            "lag": round(self.lag, 4)
+        }
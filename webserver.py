@@ -22,10 +22,17 @@ import tornado.web
 import asyncio
 
 from threading import Thread, RLock
-from configfileparser import HTTP_PORT
+from configfileparser import HTTP_PORT, WEB_SERVER, INGEST_MAX_RATE, BROADCAST_PERIOD, BROADCAST_FORMAT, OUTPUT_DISPLAY
 from tornado.web import Application
 from tornado.httpserver import HTTPServer
 from vumeterhandler import VuMeterHandler
+from vumeterwebsocket import VuMeterWebSocketHandler
+from vumeterbroadcast import Broadcaster, VuMeterBroadcastHandler
+from snapshothandler import SnapshotHandler
+from remotedisplay import RemoteDisplayHandler
+from metricshandler import MetricsHandler
+from frameprofiler import FrameProfilerHandler
+from sampler import SamplerHandler
 
 class WebServer(object):
     """ Starts Tornado web server in a separate thread """
@@ -39,6 +46,7 @@ class WebServer(object):
         self.peppy_meter = peppy_meter
         self.web_clients = []
         self.instance = None
+        self.broadcaster = None
         thread = Thread(target=self.start_web_server)
         thread.daemon = True        
         thread.start()
@@ -46,7 +54,23 @@ class WebServer(object):
     def start_web_server(self):
         """ Prepare request handlers and start server """
         
-        app = Application([(r"/vumeter", VuMeterHandler, {"peppy_meter": self.peppy_meter})])
+        config = self.peppy_meter.util.meter_config[WEB_SERVER]
+        self.broadcaster = Broadcaster(self.peppy_meter.data_source, config[BROADCAST_PERIOD], config[BROADCAST_FORMAT])
+        handlers = [
+            (r"/vumeter", VuMeterHandler, {"peppy_meter": self.peppy_meter}),
+            (r"/vumeter/ws", VuMeterWebSocketHandler, {"peppy_meter": self.peppy_meter, "max_rate": config[INGEST_MAX_RATE]}),
+            (r"/vumeter/stream", VuMeterBroadcastHandler, {"broadcaster": self.broadcaster}),
+            (r"/metrics", MetricsHandler),
+            (r"/profile/sample", SamplerHandler)
+        ]
+        # the process without display output (acquisition stage of the pipeline) has nothing to show
+        if self.peppy_meter.util.meter_config[OUTPUT_DISPLAY]:
+            handlers.extend([
+                (r"/snapshot\.(png|jpg)", SnapshotHandler, {"peppy_meter": self.peppy_meter}),
+                (r"/display", RemoteDisplayHandler, {"remote_display": self.peppy_meter.remote_display}),
+                (r"/profile/frames", FrameProfilerHandler, {"peppy_meter": self.peppy_meter})
+            ])
+        app = Application(handlers)
         http_server = HTTPServer(app)
         port = self.peppy_meter.util.meter_config[HTTP_PORT]
         asyncio.set_event_loop(asyncio.new_event_loop())